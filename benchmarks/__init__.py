@@ -0,0 +1,3 @@
+"""
+Benchmarks of the reviews library operations on synthetic libraries.
+"""
@@ -0,0 +1,137 @@
+"""
+CLI of the benchmarks: generate a synthetic library, run the benchmarks on it and
+compare the results with a baseline.
+Run from the repository root with `python -m benchmarks`.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import click
+
+from . import generator, suite
+
+
+def library_options(function):
+    """Adds the options defining the synthetic library to a command."""
+    options = [
+        click.option("--artists", default=100, help="number of artists"),
+        click.option("--albums", default=5, help="number of albums per artist"),
+        click.option("--tags", default=50, help="number of distinct tags"),
+        click.option("--producers", default=30, help="number of distinct producers"),
+        click.option("--labels", default=20, help="number of distinct labels"),
+        click.option("--body-length", default=2000, help="characters per review"),
+        click.option("--seed", default=0, help="random seed"),
+    ]
+    for option in reversed(options):
+        function = option(function)
+    return function
+
+
+@click.group()
+def main():
+    """Benchmarks of musicreviews."""
+
+
+@main.command()
+@click.argument("root_dir", type=click.Path(file_okay=False))
+@library_options
+def generate(root_dir, artists, albums, tags, producers, labels, body_length, seed):
+    """Generate a synthetic library of reviews in ROOT_DIR."""
+    count = generator.generate_library(
+        root_dir, artists, albums, tags, producers, labels, body_length, seed
+    )
+    click.echo(f"{count} reviews written in {root_dir}")
+
+
+@main.command()
+@click.option(
+    "--library",
+    type=click.Path(exists=True, file_okay=False),
+    help="existing library to use instead of generating one",
+)
+@library_options
+@click.option("--repeat", default=3, help="number of timings kept the best of")
+@click.option("--output", "-o", type=click.Path(), help="JSON file to write results")
+@click.option(
+    "--baseline", "-b", type=click.Path(exists=True), help="JSON results to compare"
+)
+@click.option("--tolerance", default=0.2, help="allowed slowdown before failing")
+def run(
+    library,
+    artists,
+    albums,
+    tags,
+    producers,
+    labels,
+    body_length,
+    seed,
+    repeat,
+    output,
+    baseline,
+    tolerance,
+):
+    """Run all benchmarks and optionally compare them to a baseline."""
+    root_dir = library or tempfile.mkdtemp(prefix="musicreviews-library-")
+    try:
+        if library is None:
+            generator.generate_library(
+                root_dir, artists, albums, tags, producers, labels, body_length, seed
+            )
+        results = suite.run(root_dir, repeat)
+    finally:
+        if library is None:
+            shutil.rmtree(root_dir)
+    results["meta"]["library"] = library or {
+        "artists": artists,
+        "albums_per_artist": albums,
+        "tags": tags,
+        "producers": producers,
+        "labels": labels,
+        "body_length": body_length,
+        "seed": seed,
+    }
+
+    for name, value in sorted(results["results"].items()):
+        click.echo(f"{name:40} {value:12.6f}")
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        click.echo(f"Results written to {os.path.abspath(output)}")
+
+    if baseline is not None:
+        with open(baseline) as f:
+            regressions = suite.compare(results, json.load(f), tolerance)
+        for name, reference, value, ratio in regressions:
+            click.echo(
+                f"Regression {name}: {reference:.6f} -> {value:.6f} ({ratio:.2f}x)"
+            )
+        if regressions:
+            sys.exit(1)
+        click.echo("No regression against baseline")
+
+
+@main.command()
+@click.option("--budget", default=0.1, help="allowed CLI import time in seconds")
+@click.option("--repeat", default=5, help="number of timings kept the best of")
+def startup(budget, repeat):
+    """Check the CLI import time and the modules it imports against a budget."""
+    duration = suite.import_time("musicreviews.cli", repeat)
+    click.echo(f"{'import_cli':40} {duration:12.6f}")
+    failed = False
+    if duration > budget:
+        click.echo(f"Import of the CLI exceeds the budget of {budget:.3f}s")
+        failed = True
+    for name in suite.imported_modules("musicreviews.cli"):
+        click.echo(f"Module {name} is imported at startup")
+        failed = True
+    if failed:
+        sys.exit(1)
+    click.echo("CLI startup within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Generator of synthetic review libraries for benchmarks.
+Reviews are written with the package review template, and the HTML export
+templates are copied next to them.
+"""
+
+import datetime
+import os
+import random
+import shutil
+
+from musicreviews import writer
+from musicreviews.formatter.utils import alphanumeric_lowercase
+
+TEMPLATES_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, "musicreviews", "templates"
+)
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis"
+).split()
+
+
+def random_body(rng, length, tracks_count):
+    """Returns a review body of about length characters, with markdown emphasis,
+    paragraphs and track references.
+    """
+    paragraphs = []
+    size = 0
+    while size < length:
+        words = [rng.choice(WORDS) for __ in range(rng.randint(20, 60))]
+        words[rng.randrange(len(words))] = "**" + rng.choice(WORDS) + "**"
+        words[rng.randrange(len(words))] = "*" + rng.choice(WORDS) + "*"
+        words[rng.randrange(len(words))] = "{%d}" % rng.randint(1, tracks_count)
+        paragraph = " ".join(words) + "."
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def add_credits(review, producers, labels):
+    """Adds producers and labels to the header of a filled review template."""
+    credits = "producers:\n{}\nlabels:\n{}\n".format(
+        "\n".join(f"- {producer}" for producer in producers),
+        "\n".join(f"- {label}" for label in labels),
+    )
+    return review.replace("\ntags:\n", "\n" + credits + "tags:\n", 1)
+
+
+def generate_library(
+    root_dir,
+    artists=100,
+    albums_per_artist=5,
+    tags=50,
+    producers=30,
+    labels=20,
+    body_length=2000,
+    seed=0,
+):
+    """Writes a synthetic library of reviews in the root directory.
+    Returns the number of reviews written.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root_dir, exist_ok=True)
+    for name in ["template.md", "template.html", "template_index.html"]:
+        shutil.copy(os.path.join(TEMPLATES_DIR, name), root_dir)
+    with open(os.path.join(root_dir, "template.md"), encoding="utf8") as f:
+        template = f.read()
+
+    tag_names = [f"tag{i}" for i in range(tags)]
+    producer_names = [f"Producer {i}" for i in range(producers)]
+    label_names = [f"Label {i}" for i in range(labels)]
+    first_date = datetime.date.today() - datetime.timedelta(days=3650)
+    count = 0
+    for i in range(artists):
+        artist = f"Artist {i}"
+        folder = os.path.join(root_dir, alphanumeric_lowercase(artist))
+        os.makedirs(folder, exist_ok=True)
+        for j in range(albums_per_artist):
+            album = f"Album {i} {j}"
+            tracks = [f"Track {k}: {album}" for k in range(rng.randint(5, 15))]
+            review = writer.fill_review_template(
+                template,
+                artist,
+                album,
+                rng.randint(1950, 2020),
+                rng.randint(0, 100),
+                uri=f"spotify:album:{i}x{j}",
+                cover="https://example.com/cover.jpg",
+                picks=sorted(rng.sample(range(1, len(tracks) + 1), 2)),
+                tags=rng.sample(tag_names, min(3, tags)),
+                tracks=tracks,
+                content=random_body(rng, body_length, len(tracks)),
+                date=(first_date + datetime.timedelta(days=rng.randrange(3650))),
+            )
+            review = add_credits(
+                review,
+                rng.sample(producer_names, min(2, producers)),
+                rng.sample(label_names, min(1, labels)),
+            )
+            filename = alphanumeric_lowercase(album) + ".md"
+            with open(os.path.join(folder, filename), "w", encoding="utf8") as f:
+                f.write(review)
+            count += 1
+    return count
@@ -0,0 +1,252 @@
+"""
+Benchmarks of the library loading, indexing, export and query functions.
+Each benchmark is timed several times on a synthetic library and the best time
+is kept. Results can be compared to a baseline to detect regressions.
+"""
+
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from musicreviews import indexer, querier, reader, sqlstore, writer
+from musicreviews.formatter import html, markdown
+
+# index functions benchmarked one by one
+INDEX_FUNCTIONS = [function for function, __, __ in indexer.INDEX_PIPELINES]
+# modules the CLI must not import before a command needs them
+DEFERRED_MODULES = (
+    "frontmatter",
+    "musicreviews.exporter",
+    "musicreviews.formatter.html",
+    "musicreviews.server",
+    "musicreviews.spotify",
+    "musicreviews.writer",
+    "powerspot",
+    "yaml",
+)
+
+
+def best_time(function, repeat):
+    """Returns the best wall time in seconds of repeated calls of the function."""
+    times = []
+    for __ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_build_database(root_dir, repeat):
+    """Times building the database, without cache, with a cold and a warm cache."""
+    cache_path = reader.cache_path(root_dir)
+
+    def cold_cache():
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        reader.build_database(root_dir, use_cache=True)
+
+    try:
+        return {
+            "build_database": best_time(
+                lambda: reader.build_database(root_dir), repeat
+            ),
+            "build_database_header_only": best_time(
+                lambda: reader.build_database(root_dir, header_only=True), repeat
+            ),
+            "build_database_cold_cache": best_time(cold_cache, repeat),
+            "build_database_warm_cache": best_time(
+                lambda: reader.build_database(root_dir, use_cache=True), repeat
+            ),
+        }
+    finally:
+        # the cache is kept in the configuration directory, not in the library
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+
+def benchmark_indexer(albums, root_dir, repeat):
+    """Times each index function, and generating all indexes in both formats."""
+    results = {}
+    for function in INDEX_FUNCTIONS:
+        results[f"indexer.{function.__name__}"] = best_time(
+            lambda: "".join(function(markdown, albums)), repeat
+        )
+    for extension in ["md", "html"]:
+        results[f"generate_all_indexes.{extension}"] = best_time(
+            lambda: indexer.generate_all_indexes(
+                albums, root_dir, extension=extension, base_url="."
+            ),
+            repeat,
+        )
+    return results
+
+
+def benchmark_export(albums, root_dir, repeat):
+    """Times exporting all reviews to HTML."""
+    for album in albums:
+        os.makedirs(os.path.join(root_dir, album["artist_tag"]), exist_ok=True)
+
+    def export_all():
+        for album in albums:
+            writer.export_review(reader.copy_album(album), root=root_dir, base_url=".")
+
+    return {"export_review": best_time(export_all, repeat)}
+
+
+def benchmark_markdown(albums, repeat):
+    """Times converting all reviews content to HTML, without and with track
+    references filled, and returns the throughputs in MB of review text per second.
+    """
+    albums = [reader.copy_album(album) for album in albums]
+    megabytes = sum(len(album["content"].encode("utf8")) for album in albums) / 1e6
+    duration = best_time(
+        lambda: [html.markdown_to_html(album["content"]) for album in albums], repeat
+    )
+    fields_duration = best_time(
+        lambda: [html.markdown_to_html(album["content"], album) for album in albums],
+        repeat,
+    )
+    return {
+        "markdown_to_html": duration,
+        "markdown_to_html_mb_per_s": megabytes / duration if duration else 0.0,
+        "markdown_to_html_fields": fields_duration,
+        "markdown_to_html_fields_mb_per_s": (
+            megabytes / fields_duration if fields_duration else 0.0
+        ),
+    }
+
+
+def benchmark_query(albums, repeat):
+    """Times building the query engine and running typical queries."""
+    tags = querier.QueryEngine(albums).values("tags")[:2]
+
+    def queries():
+        engine = querier.QueryEngine(albums)
+        engine.query(min_year=1990, max_year=1999)
+        engine.query(min_rating=80)
+        engine.query(tags=tags[:1])
+        engine.query(min_year=1970, min_rating=50, tags=tags)
+
+    return {"query": best_time(queries, repeat)}
+
+
+def benchmark_sqlite(root_dir, repeat):
+    """Times syncing the SQLite database from scratch and when up to date, loading
+    its albums and running typical queries in the database.
+    """
+    tags = querier.QueryEngine(reader.build_database(root_dir)).values("tags")[:2]
+
+    def queries():
+        connection = sqlstore.open_database(root_dir)
+        engine = sqlstore.SqlQueryEngine(connection)
+        engine.query(min_year=1990, max_year=1999)
+        engine.query(min_rating=80)
+        engine.query(tags=tags[:1])
+        engine.query(min_year=1970, min_rating=50, tags=tags)
+        connection.close()
+
+    try:
+        return {
+            "sqlite_rebuild": best_time(
+                lambda: sqlstore.build_database(root_dir, rebuild=True), repeat
+            ),
+            "sqlite_warm": best_time(
+                lambda: sqlstore.build_database(root_dir), repeat
+            ),
+            "sqlite_query": best_time(queries, repeat),
+        }
+    finally:
+        os.remove(sqlstore.database_path(root_dir))
+
+
+def import_time(module, repeat):
+    """Returns the best cumulative import time in seconds of the module, measured
+    with `python -X importtime` in fresh interpreters.
+    """
+    times = []
+    for __ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        ).stderr
+        for line in output.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            __, cumulative, name = line.split("|")
+            if name.strip() == module:
+                times.append(int(cumulative) / 1e6)
+    return min(times)
+
+
+def imported_modules(module):
+    """Returns the deferred modules imported along with the module."""
+    code = (
+        f"import sys, {module}; "
+        f"print(' '.join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    ).stdout
+    return output.split()
+
+
+def benchmark_startup(repeat):
+    """Times importing the CLI, which all commands pay before running."""
+    return {"import_cli": import_time("musicreviews.cli", repeat)}
+
+
+def run(root_dir, repeat=3):
+    """Runs all benchmarks on the library in the root directory.
+    Outputs are written in a temporary directory. Returns the results as a dict.
+    """
+    results = {}
+    results.update(benchmark_build_database(root_dir, repeat))
+    albums = reader.build_database(root_dir)
+    output_dir = tempfile.mkdtemp(prefix="musicreviews-bench-")
+    try:
+        for name in ["template.html", "template_index.html"]:
+            shutil.copy(os.path.join(root_dir, name), output_dir)
+        results.update(benchmark_indexer(albums, output_dir, repeat))
+        results.update(benchmark_export(albums, output_dir, repeat))
+    finally:
+        shutil.rmtree(output_dir)
+    results.update(benchmark_markdown(albums, repeat))
+    results.update(benchmark_query(albums, repeat))
+    results.update(benchmark_sqlite(root_dir, repeat))
+    results.update(benchmark_startup(repeat))
+    return {
+        "meta": {
+            "reviews": len(albums),
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Compares results to a baseline. Returns a list of (name, baseline time,
+    time, ratio) for benchmarks slower than the baseline by more than tolerance.
+    Throughputs, whose names end with _per_s, are regressions when lower.
+    """
+    regressions = []
+    for name, value in sorted(results["results"].items()):
+        reference = baseline["results"].get(name)
+        if not reference or not value:
+            continue
+        ratio = value / reference
+        if name.endswith("_per_s"):
+            ratio = 1 / ratio
+        if ratio > 1 + tolerance:
+            regressions.append((name, reference, value, ratio))
+    return regressions
@@ -1,3 +1,31 @@
-from . import cli, configuration, formatter, indexer, reader, ui, writer
+"""
+Submodules are imported on first access, so that the CLI only imports what the
+invoked commands use.
+"""
 
-__all__ = ["cli", "configuration", "formatter", "indexer", "reader", "ui", "writer"]
+import importlib
+
+__all__ = [
+    "cli",
+    "configuration",
+    "exporter",
+    "formatter",
+    "indexer",
+    "querier",
+    "queuestore",
+    "reader",
+    "server",
+    "spotify",
+    "sqlstore",
+    "store",
+    "timing",
+    "ui",
+    "watcher",
+    "writer",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,23 +1,96 @@
 """
 CLI of the package to access functions.
+Modules only used by some commands, such as the Spotify client, the formatters
+and the server, are imported by these commands to keep the startup fast.
 """
 
 import datetime
-import json
 import os
 from functools import partial
 
 import click
-from powerspot.cli import get_username
-from powerspot.operations import (
-    get_album,
-    get_artist_albums,
-    get_playing_track,
-    get_saved_albums,
-    search_artist,
-)
 
-from musicreviews import configuration, formatter, indexer, reader, ui, writer
+from musicreviews import configuration, querier, reader, timing, ui
+
+
+def send_request(server_url, path, parameters=None, method="POST"):
+    """Sends a request to a library server and returns its response.
+    Returns None if the server could not answer.
+    """
+    from musicreviews import server
+
+    try:
+        return server.request(server_url, path, parameters, method)
+    except OSError as error:
+        click.echo(ui.style_error(f"Request to library server failed: {error}"))
+        return None
+
+
+def start_profiling(ctx, profile_path):
+    """Records timings, and a cProfile profile unless a JSON trace is requested,
+    until the end of the invocation where they are reported.
+    """
+    timing.enable()
+    profiler = None
+    if profile_path is not None and not profile_path.endswith(".json"):
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def report():
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        elif profile_path is not None:
+            timing.write_trace(profile_path)
+        click.echo(ui.style_info("\nTimings:"))
+        click.echo(timing.summary())
+        if profile_path is not None:
+            click.echo(ui.style_info_path("Profile written to", profile_path))
+
+    ctx.call_on_close(report)
+
+
+def completion_index(ctx, field, ignore_case=False):
+    """Returns the completion index of a field of the library albums.
+    Indexes are built once per library load, and shared by chained commands.
+    """
+    key = (field, ignore_case)
+    if key not in ctx.obj["completions"]:
+        ctx.obj["completions"][key] = ui.CompletionIndex(
+            (album[field] for album in ctx.obj["albums"]), ignore_case=ignore_case
+        )
+    return ctx.obj["completions"][key]
+
+
+def spotify_username(ctx):
+    """Returns the Spotify username, asking for it on first use if not given."""
+    if ctx.obj["username"] is None:
+        from powerspot.cli import get_username
+
+        ctx.obj["username"] = get_username()
+        click.echo(ui.style_info(f"Welcome {ctx.obj['username']}\n"))
+    return ctx.obj["username"]
+
+
+def library_index(ctx):
+    """Returns the lookup index of the library albums, built once per library load."""
+    if ctx.obj["library_index"] is None:
+        ctx.obj["library_index"] = querier.LibraryIndex(ctx.obj["albums"])
+    return ctx.obj["library_index"]
+
+
+def review_exists(ctx, artist, album, uri=None):
+    """Returns whether the album is already reviewed, printing the existing review."""
+    existing = library_index(ctx).find(artist, album, uri)
+    if existing is None:
+        return False
+    click.echo(
+        click.style("Review already exists: ", fg="white")
+        + ui.style_album(existing["artist"], existing["album"], existing["year"])
+    )
+    return True
 
 
 @click.group(chain=True)
@@ -26,10 +99,32 @@ from musicreviews import configuration, formatter, indexer, reader, ui, writer
 @click.option("--client", default=lambda: os.getenv("SPOTIPY_CLIENT_ID"))
 @click.option("--secret", default=lambda: os.getenv("SPOTIPY_CLIENT_SECRET"))
 @click.option("--redirect", default=lambda: os.getenv("SPOTIPY_REDIRECT_URI"))
-def main(ctx, username: str, client: str, secret: str, redirect: str) -> None:
+@click.option(
+    "--workers", "-w", type=int, help="number of processes used to parse reviews"
+)
+@click.option("--offline", is_flag=True, help="do not use Spotify")
+@click.option("--timings", is_flag=True, help="print the time spent in each phase")
+@click.option(
+    "--profile",
+    type=click.Path(dir_okay=False),
+    help="write a cProfile stats file, or a JSON trace if it ends with .json",
+)
+def main(
+    ctx,
+    username: str,
+    client: str,
+    secret: str,
+    redirect: str,
+    workers: int,
+    offline: bool,
+    timings: bool,
+    profile: str,
+) -> None:
     """CLI for album reviews management."""
     click.echo(click.style(ui.GREET, fg="magenta", bold=True))
     ctx.obj = {}
+    if timings or profile is not None:
+        start_profiling(ctx, profile)
 
     config_path, config_content = configuration.load_config()
     click.echo(ui.style_info_path("Loading configuration at", config_path))
@@ -38,62 +133,203 @@ def main(ctx, username: str, client: str, secret: str, redirect: str) -> None:
         config_content = ctx.invoke(setup)
 
     root_dir = os.path.abspath(config_content["path"]["reviews_directory"])
-    click.echo(ui.style_info_path("Loading review library from directory", root_dir))
-    albums = reader.build_database(root_dir)
+    if workers is None:
+        workers = config_content.getint("library", "workers", fallback=1)
 
-    if username is None:
-        username = get_username()
-    click.echo(ui.style_info(f"Welcome {username}\n"))
+    def load_albums():
+        click.echo(
+            ui.style_info_path("Loading review library from directory", root_dir)
+        )
+        with timing.phase("load library"):
+            if config_content.getboolean("library", "sqlite", fallback=False):
+                from musicreviews import sqlstore
+
+                albums = sqlstore.build_database(root_dir, workers=workers)
+            else:
+                albums = reader.build_database(
+                    root_dir,
+                    use_cache=config_content.getboolean(
+                        "library", "cache", fallback=True
+                    ),
+                    workers=workers,
+                    header_only=config_content.getboolean(
+                        "library", "header_only", fallback=False
+                    ),
+                )
+            if config_content.getboolean("library", "columnar", fallback=False):
+                from musicreviews import store
+
+                albums = store.AlbumStore.from_albums(albums, root_dir)
+        return albums
+
+    # the library is only loaded if a command uses it, and once for chained commands
+    albums = reader.LazyDatabase(load_albums)
+
+    if offline:
+        click.echo(ui.style_info("Offline mode, Spotify is not used\n"))
+    elif username is not None:
+        click.echo(ui.style_info(f"Welcome {username}\n"))
 
     ctx.obj["root_dir"] = root_dir
     ctx.obj["albums"] = albums
     ctx.obj["username"] = username
     ctx.obj["config"] = config_content
+    ctx.obj["workers"] = workers
+    ctx.obj["offline"] = offline
+    ctx.obj["completions"] = {}
+    ctx.obj["library_index"] = None
 
 
 @main.command()
+@click.option(
+    "--force", "-f", is_flag=True, help="regenerate indexes even if up to date"
+)
+@click.option("--server", "-s", "server_url", help="URL of a library server to use")
 @click.pass_context
-def index(ctx):
+def index(ctx, force, server_url):
     """Generate various reviews indexes and lists."""
-    indexer.generate_all_indexes(ctx.obj["albums"], ctx.obj["root_dir"], extension="md")
-    click.echo(ui.style_info("Indexes generated"))
+    from musicreviews import indexer
+
+    if server_url is not None:
+        response = send_request(server_url, "/index", {"force": 1} if force else {})
+        if response is None:
+            return
+        written = response["indexes"]
+    else:
+        written = indexer.generate_all_indexes(
+            ctx.obj["albums"],
+            ctx.obj["root_dir"],
+            extension="md",
+            incremental=not force,
+            config=ctx.obj["config"],
+        )
+    click.echo(ui.style_info(f"Indexes generated, {len(written)} files updated"))
+
+
+def range_filter(value):
+    """Returns the minimum and maximum values of a filter like 2016, =2016, +2010
+    or -1990, which are exact, minimum and maximum values.
+    """
+    if value is None:
+        return None, None
+    if value.startswith("+"):
+        return int(value[1:]), None
+    if value.startswith("-"):
+        return None, int(value[1:])
+    value = int(value.replace("=", ""))
+    return value, value
+
+
+@main.command()
+@click.option("--year", "-y", help="years filter, for example 2016, +2010, -1990")
+@click.option("--rating", "-r", help="rating filter, for example 82, +80, -60")
+@click.option("--tags", "-t", help="tags filter, for example rock,electro")
+@click.option("--since", type=click.DateTime(["%Y-%m-%d"]), help="minimum review date")
+@click.option("--until", type=click.DateTime(["%Y-%m-%d"]), help="maximum review date")
+@click.option("--producer", "producers", multiple=True, help="required producer")
+@click.option("--label", "labels", multiple=True, help="required label")
+@click.option("--sort", "-s", help="sorting fields, for example rating")
+@click.option("--ascending", "-a", is_flag=True, help="sort by ascending value")
+@click.option("--server", "server_url", help="URL of a library server to use")
+@click.pass_context
+def query(
+    ctx,
+    year,
+    rating,
+    tags,
+    since,
+    until,
+    producers,
+    labels,
+    sort,
+    ascending,
+    server_url,
+):
+    """Query, filter and sort reviews."""
+    min_year, max_year = range_filter(year)
+    min_rating, max_rating = range_filter(rating)
+    filters = {
+        "min_year": min_year,
+        "max_year": max_year,
+        "min_rating": min_rating,
+        "max_rating": max_rating,
+        "since": since.date() if since is not None else None,
+        "until": until.date() if until is not None else None,
+        "tags": tags.split(",") if tags is not None else (),
+        "producers": producers,
+        "labels": labels,
+    }
+    if server_url is not None:
+        parameters = {
+            name: value for name, value in filters.items() if value not in (None, ())
+        }
+        response = send_request(server_url, "/query", parameters, method="GET")
+        if response is None:
+            return
+        matches = response["albums"]
+    elif (
+        ctx.obj["config"].getboolean("library", "sqlite", fallback=False)
+        and not ctx.obj["albums"].loaded
+    ):
+        from musicreviews import sqlstore
+
+        # filters run in the database instead of on the whole loaded library
+        connection = sqlstore.open_database(ctx.obj["root_dir"])
+        with timing.phase("sync database"):
+            sqlstore.sync(connection, ctx.obj["root_dir"], ctx.obj["workers"])
+        with timing.phase("query database"):
+            matches = sqlstore.SqlQueryEngine(connection).query(**filters)
+        connection.close()
+    else:
+        matches = querier.QueryEngine(ctx.obj["albums"]).query(**filters)
+    if sort is not None:
+        matches = sorted(matches, key=lambda x: x[sort], reverse=not ascending)
+
+    for album in matches:
+        click.echo(ui.style_album(album["artist"], album["album"], album["year"]))
 
 
 @main.command()
 @click.pass_context
 def queue(ctx):
     """Manage the queue of albums to review."""
+    from powerspot.operations import get_saved_albums
+
+    from musicreviews import queuestore
+
     queue_path = os.path.abspath(ctx.obj["config"]["path"]["queue"])
     click.echo(ui.style_info_path("Managing queue stored in", queue_path))
 
     # retrieve queue
-    if os.path.exists(queue_path):
-        with open(queue_path, "r") as file_content:
-            queue = json.load(file_content)
-    else:
-        queue = []
+    queue = queuestore.QueueStore(queue_path)
     click.echo(ui.style_info(f"Queue contains {len(queue)} albums"))
 
     # update queue with user library albums
-    if click.confirm(ui.style_prompt("Update queue with library albums")):
-        saved_albums = get_saved_albums(ctx.obj["username"])
-        saved_uris = set([album["album"]["uri"] for album in saved_albums])
-        known_uris = set([album["uri"] for album in ctx.obj["albums"]])
-        queue_uris = set([album["uri"] for album in queue])
+    if ctx.obj["offline"]:
+        click.echo(ui.style_info("Offline mode, queue is not updated from library"))
+    elif click.confirm(ui.style_prompt("Update queue with library albums")):
+        # saved albums hold the data of the albums, no other request is needed
+        saved_albums = {
+            album["album"]["uri"]: album["album"]
+            for album in get_saved_albums(spotify_username(ctx))
+        }
+        saved_uris = saved_albums.keys()
+        known_uris = library_index(ctx).by_uri.keys()
+        queue_uris = queue.uris()
         # prompt for unreviewed albums that were removed from library
         for uri in queue_uris - saved_uris:
-            album = next(album for album in queue if album["uri"] == uri)
+            album = queue.get(uri)
             click.echo(
                 click.style("Unreviewed album was removed from library: ", fg="white")
                 + ui.style_album(album["artist"], album["album"], album["year"])
             )
             if click.confirm(ui.style_prompt("Remove from queue"), default=True):
                 queue_uris.remove(uri)
-                queue.remove(album)
+                queue.remove(uri)
         # add new uris to queue
-        for uri in saved_uris - known_uris - queue_uris:
-            album_data = get_album(uri)
-            queue.append(
+        for uri in sorted(saved_uris - known_uris - queue_uris):
+            album_data = saved_albums[uri]
+            queue.add(
                 {
                     "artist": album_data["artists"][0]["name"],
                     "album": album_data["name"],
@@ -102,13 +338,13 @@ def queue(ctx):
                 }
             )
         click.echo(ui.style_info(f"Queue contains {len(queue)} albums"))
-        # save current queue
-        writer.write_file(json.dumps(queue), queue_path)
 
     # show artists in queue
-    artists_in_queue = sorted(set([album["artist"] for album in queue]))
+    artists_in_queue = ui.CompletionIndex(
+        (album["artist"] for album in queue), ignore_case=True
+    )
     click.echo(ui.style_info("Artists in queue:"))
-    for i, artist in enumerate(artists_in_queue):
+    for i, artist in enumerate(artists_in_queue.values):
         click.echo(ui.style_enumerate(i, artist))
 
     # prompt the user for a direct artist search
@@ -120,7 +356,7 @@ def queue(ctx):
     # if no matches, prompt the user for each album in the queue
     if len(matches) == 0:
         click.echo(ui.style_info("No matches found, going over the whole queue"))
-        matches = queue
+        matches = list(queue)
 
     # prompt for review creation and delete reviewed albums from queue
     idx = 0
@@ -134,9 +370,8 @@ def queue(ctx):
         if click.confirm(ui.style_prompt("Review this album")):
             # pop album from queue only if review creation is confirmed
             if ctx.invoke(create, uri=match["uri"]):
-                queue = [album for album in queue if album["uri"] != match["uri"]]
-                # rewrite queue in case procedure is cancelled later
-                writer.write_file(json.dumps(queue), queue_path)
+                # saved at once in case procedure is cancelled later
+                queue.remove(match["uri"])
 
 
 @main.command()
@@ -147,18 +382,17 @@ def queue(ctx):
 @click.pass_context
 def create(ctx, uri, playing, manual, y):
     """Create a review using data retrieved from Spotify or manually entered."""
-    known_artists = [x["artist"] for x in ctx.obj["albums"]]
+    from musicreviews import writer
+    from musicreviews.formatter.utils import alphanumeric_lowercase
+
+    known_artists = completion_index(ctx, "artist", ignore_case=True)
     if manual:
         # manual input of data
         artist = ui.completion_input(ui.style_prompt("Artist"), known_artists)
         album = click.prompt(ui.style_prompt("Album"))
-        if artist in known_artists:
-            artist_albums = [
-                x["album"] for x in ctx.obj["albums"] if x["artist"] == artist
-            ]
-            if album in artist_albums:
-                click.echo(ui.style_error("Review already exists, operation aborted"))
-                return False
+        if review_exists(ctx, artist, album):
+            click.echo(ui.style_error("Operation aborted"))
+            return False
         year = click.prompt(
             ui.style_prompt("Year"),
             value_proc=partial(
@@ -174,10 +408,21 @@ def create(ctx, uri, playing, manual, y):
         )
         tracks = None
         cover = None
+    elif ctx.obj["offline"]:
+        click.echo(ui.style_error("Offline mode, use manual input of album data"))
+        return False
     else:
+        from powerspot.operations import (
+            get_artist_albums,
+            get_playing_track,
+            search_artist,
+        )
+
+        from musicreviews import spotify
+
         if playing:
             # album from currently playing track
-            track = get_playing_track(ctx.obj["username"])
+            track = get_playing_track(spotify_username(ctx))
             if track is not None:
                 uri = track["item"]["album"]["uri"]
 
@@ -214,17 +459,18 @@ def create(ctx, uri, playing, manual, y):
                 default=0,
             )
             uri = res_albums[album_idx]["uri"]
-        album_data = get_album(uri)
+        client = spotify.load_client(ctx.obj["config"])
+        album_data = client.album(uri)
+        client.cache.save()
+        if album_data is None:
+            click.echo(ui.style_error("Album not found on Spotify, operation aborted"))
+            return False
         # retrieve useful fields from Spotify data
         artist = album_data["artists"][0]["name"]
         album = album_data["name"]
-        if artist in known_artists:
-            artist_albums = [
-                x["album"] for x in ctx.obj["albums"] if x["artist"] == artist
-            ]
-            if album in artist_albums:
-                click.echo(ui.style_error("Review already exists, operation aborted"))
-                return False
+        if review_exists(ctx, artist, album, uri):
+            click.echo(ui.style_error("Operation aborted"))
+            return False
         year = album_data["release_date"][:4]
         tracks = [track["name"] for track in album_data["tracks"]["items"]]
         cover = album_data["images"][0]["url"]
@@ -260,8 +506,8 @@ def create(ctx, uri, playing, manual, y):
     )
 
     root_dir = ctx.obj["root_dir"]
-    folder = formatter.utils.alphanumeric_lowercase(artist)
-    filename = formatter.utils.alphanumeric_lowercase(album)
+    folder = alphanumeric_lowercase(artist)
+    filename = alphanumeric_lowercase(album)
     if not filename:
         filename = click.prompt(ui.style_prompt("Filename"))
     click.echo(
@@ -272,7 +518,7 @@ def create(ctx, uri, playing, manual, y):
         + click.style(filename, fg="blue", bold=True)
     )
     if click.confirm(ui.style_prompt("Confirm creation of review"), default=True) or y:
-        template = reader.read_file(root_dir, "template.md")
+        template = reader.read_template(root_dir, "template.md")
         review = writer.fill_review_template(
             template,
             artist,
@@ -291,12 +537,134 @@ def create(ctx, uri, playing, manual, y):
     return False
 
 
+@main.command()
+@click.option("--host", default="127.0.0.1", help="address to listen on")
+@click.option("--port", "-p", type=int, help="port to listen on")
+@click.pass_context
+def serve(ctx, host, port):
+    """Serve the library from memory to query, index and export commands."""
+    from musicreviews import server
+
+    if port is None:
+        port = server.DEFAULT_PORT
+    click.echo(
+        ui.style_info_path("Loading review library from directory", ctx.obj["root_dir"])
+    )
+    library_server = server.LibraryServer(
+        (host, port),
+        ctx.obj["root_dir"],
+        ctx.obj["config"],
+        workers=ctx.obj["workers"],
+        use_cache=ctx.obj["config"].getboolean("library", "cache", fallback=True),
+        header_only=ctx.obj["config"].getboolean(
+            "library", "header_only", fallback=False
+        ),
+    )
+    click.echo(ui.style_info(f"Serving {len(library_server.albums)} reviews"))
+    click.echo(ui.style_info(f"Listening on http://{host}:{port}, Ctrl-C to stop"))
+    try:
+        library_server.serve_forever()
+    except KeyboardInterrupt:
+        click.echo(ui.style_info("Server stopped"))
+    finally:
+        library_server.server_close()
+
+
+@main.command()
+@click.option("--export", "-e", is_flag=True, help="keep HTML export up to date")
+@click.option(
+    "--debounce",
+    "-d",
+    default=1.0,
+    help="seconds without modifications before rebuilding",
+)
+@click.option("--poll", is_flag=True, help="poll files instead of using inotify")
+@click.pass_context
+def watch(ctx, export, debounce, poll):
+    """Keep indexes and HTML export up to date while reviews are modified."""
+    from musicreviews import exporter, indexer, watcher
+
+    root_dir = ctx.obj["root_dir"]
+    config = ctx.obj["config"]
+    export_dir = config["path"]["export_directory"]
+    base_url = config["web"]["base_url"]
+    use_cache = config.getboolean("library", "cache", fallback=True)
+    header_only = config.getboolean("library", "header_only", fallback=False)
+    signature = reader.cache_signature(root_dir, header_only)
+    entries = reader.load_cache(root_dir, signature) if use_cache else {}
+
+    def rebuild(initial=False):
+        nonlocal entries
+        try:
+            albums, entries, changed = reader.update_database(
+                root_dir, entries, ctx.obj["workers"], header_only
+            )
+        except reader.ReviewError as error:
+            # keep watching, the review is parsed again once it is fixed
+            click.echo(ui.style_error(f"Invalid review {error}"))
+            return
+        if not (changed or initial):
+            return
+        if use_cache and changed:
+            reader.write_cache(root_dir, signature, entries)
+        written = indexer.generate_all_indexes(
+            albums, root_dir, extension="md", incremental=True, config=config
+        )
+        click.echo(ui.style_info(f"Indexes generated, {len(written)} files updated"))
+        if export:
+            written = indexer.generate_all_indexes(
+                albums,
+                export_dir,
+                extension="html",
+                base_url=base_url,
+                incremental=True,
+                config=config,
+            )
+            click.echo(
+                ui.style_info(f"HTML indexes generated, {len(written)} files updated")
+            )
+            skipped = exporter.export_library(
+                albums,
+                root_dir,
+                export_dir,
+                base_url=base_url,
+                workers=ctx.obj["workers"],
+            )
+            click.echo(ui.style_info(f"Reviews exported, {skipped} up to date skipped"))
+
+    # bring outputs up to date with reviews modified before watching
+    rebuild(initial=True)
+    if poll or not watcher.inotify_available:
+        click.echo(ui.style_info("Polling reviews for modifications"))
+    click.echo(ui.style_info_path("Watching reviews in", root_dir))
+    try:
+        watcher.watch(root_dir, rebuild, debounce=debounce, polling=poll)
+    except KeyboardInterrupt:
+        click.echo(ui.style_info("Stopped watching"))
+
+
+@main.command()
+@click.option("--rebuild", "-r", is_flag=True, help="parse all reviews again")
+@click.pass_context
+def sync(ctx, rebuild):
+    """Update the SQLite database of the library with the modified reviews."""
+    from musicreviews import sqlstore
+
+    root_dir = ctx.obj["root_dir"]
+    click.echo(ui.style_info_path("Syncing database", sqlstore.database_path(root_dir)))
+    connection = sqlstore.open_database(root_dir, rebuild=rebuild)
+    with timing.phase("sync database"):
+        parsed, removed = sqlstore.sync(connection, root_dir, ctx.obj["workers"])
+    connection.close()
+    click.echo(ui.style_info(f"Database synced, {parsed} parsed, {removed} removed"))
+
+
 @main.command()
 @click.pass_context
 def setup(ctx):
     """Configure review library settings."""
-    __, template_config = configuration.load_config(load_template=True)
-    __, config = configuration.load_config()
+    __, template_config = configuration.read_config(load_template=True)
+    __, config = configuration.read_config()
     if config is None:
         config = template_config
 
@@ -342,7 +710,7 @@ def setup(ctx):
             configuration.copy_template_html(config["path"]["export_directory"]),
         )
     )
-    return config
+    return configuration.Config.from_parser(config)
 
 
 @main.command()
@@ -351,112 +719,105 @@ def setup(ctx):
     "--all", "-a", is_flag=True, help="export all reviews and indexes in library"
 )
 @click.option("--index", "-i", is_flag=True, help="export indexes")
-def export(ctx, all, index):
+@click.option(
+    "--force", "-f", is_flag=True, help="regenerate indexes even if up to date"
+)
+@click.option(
+    "--workers", "-w", type=int, help="number of processes used to export reviews"
+)
+@click.option("--server", "-s", "server_url", help="URL of a library server to use")
+def export(ctx, all, index, force, workers, server_url):
     """Exports a review or all reviews to HTML."""
+    from musicreviews import exporter, indexer, writer
+
     export_dir = ctx.obj["config"]["path"]["export_directory"]
     base_url = ctx.obj["config"]["web"]["base_url"]
     click.echo(ui.style_info_path("Exporting to directory", export_dir))
 
+    if server_url is not None:
+        if not (all or index):
+            click.echo(ui.style_error("Only --all or --index exports use a server"))
+            return
+        parameters = {"index": 1} if index else {}
+        if force:
+            parameters["force"] = 1
+        response = send_request(server_url, "/export", parameters)
+        if response is not None:
+            written = response["indexes"]
+            click.echo(
+                ui.style_info(f"Indexes generated, {len(written)} files updated")
+            )
+            if not index:
+                skipped = response["skipped"]
+                click.echo(
+                    ui.style_info(f"Reviews exported, {skipped} up to date skipped")
+                )
+        return
+
     if all or index:
-        indexer.generate_all_indexes(
-            ctx.obj["albums"], export_dir, extension="html", base_url=base_url
+        written = indexer.generate_all_indexes(
+            ctx.obj["albums"],
+            export_dir,
+            extension="html",
+            base_url=base_url,
+            incremental=not force,
+            config=ctx.obj["config"],
         )
-        click.echo(ui.style_info("Indexes generated"))
+        click.echo(ui.style_info(f"Indexes generated, {len(written)} files updated"))
     if index:
         return
 
     if all:
-        albums_to_export = ctx.obj["albums"]
-    else:
-        # prompt to choose artist then album to export
-        artist_tags = [x["artist_tag"] for x in ctx.obj["albums"]]
-        artist_tag = ui.completion_input(
-            ui.style_prompt("Artist tag of review to export"),
-            artist_tags,
-            type=click.Choice(artist_tags),
-            show_choices=False,
+        skipped = exporter.export_library(
+            ctx.obj["albums"],
+            ctx.obj["root_dir"],
+            export_dir,
+            base_url=base_url,
+            force=force,
+            workers=workers or ctx.obj["workers"],
         )
+        click.echo(ui.style_info(f"Reviews exported, {skipped} up to date skipped"))
+        return
 
-        artist_albums = [
-            album for album in ctx.obj["albums"] if album["artist_tag"] == artist_tag
-        ]
-        album_tags = [album["album_tag"] for album in artist_albums]
-        click.echo(ui.style_info("Album reviews tags:"))
-        for i, tag in enumerate(album_tags):
-            click.echo(ui.style_enumerate(i, tag))
-        album_tag = ui.completion_input(
-            ui.style_prompt("Album tag of review to export"),
-            album_tags,
-            type=click.Choice(album_tags),
-            show_choices=False,
-        )
+    # prompt to choose artist then album to export
+    artist_tags = completion_index(ctx, "artist_tag")
+    artist_tag = ui.completion_input(
+        ui.style_prompt("Artist tag of review to export"),
+        artist_tags,
+        type=click.Choice(artist_tags.values),
+        show_choices=False,
+    )
+
+    artist_albums = [
+        album for album in ctx.obj["albums"] if album["artist_tag"] == artist_tag
+    ]
+    album_tags = [album["album_tag"] for album in artist_albums]
+    click.echo(ui.style_info("Album reviews tags:"))
+    for i, tag in enumerate(album_tags):
+        click.echo(ui.style_enumerate(i, tag))
+    album_tag = ui.completion_input(
+        ui.style_prompt("Album tag of review to export"),
+        album_tags,
+        type=click.Choice(album_tags),
+        show_choices=False,
+    )
 
-        albums_to_export = [
-            album for album in artist_albums if album["album_tag"] == album_tag
-        ]
+    albums_to_export = [
+        album for album in artist_albums if album["album_tag"] == album_tag
+    ]
 
     for album in albums_to_export:
         click.echo(ui.style_info(f"{album['artist_tag']}/{album['album_tag']}"))
-        writer.export_review(album, root=export_dir, base_url=base_url)
+        # exporting formats the fields in place
+        writer.export_review(
+            reader.copy_album(album), root=export_dir, base_url=base_url
+        )
     click.echo(ui.style_info("Reviews exported"))
 
-    # build artist indexes
-    artist_tags = set([album["artist_tag"] for album in albums_to_export])
-    for artist_tag in artist_tags:
-        specific_albums = sorted(
-            [x for x in albums_to_export if x["artist_tag"] == artist_tag],
-            key=lambda x: (x["year"], x["rating"]),
-            reverse=True,
-        )
-        content = formatter.html.parse_list(
-            specific_albums, formatter.html.format_album
-        )
-        index_template = reader.read_file(export_dir, "template_index.html")
-        title = specific_albums[0]["artist"]
-        content = index_template.format(title=title, base_url=base_url, content=content)
-        writer.write_file(content, os.path.join(export_dir, artist_tag, "index.html"))
+    # the index lists all the albums of the artist, as export --all writes it
+    writer.export_artist_index(artist_albums, root=export_dir, base_url=base_url)
     click.echo(ui.style_info("Artist indexes generated"))
 
 
-@main.command()
-@click.option("--year", "-y", help="years filter, for example 2016, +2010, -1990")
-@click.option("--rating", "-r", help="rating filter, for example 82, +80, -60")
-@click.option("--tags", "-t", help="tags filter, for example rock,electro")
-@click.option("--sort", "-s", help="sorting fields, for example rating")
-@click.option("--ascending", "-a", is_flag=True, help="sort by ascending value")
-@click.pass_context
-def query(ctx, year, rating, tags, sort, ascending):
-    """Query, filter and sort reviews."""
-    albums = ctx.obj["albums"]
-
-    if year is not None:
-        if "=" in year:
-            albums = [x for x in albums if x["year"] == int(year.replace("=", ""))]
-        elif "+" in year:
-            albums = [x for x in albums if x["year"] >= int(year.replace("+", ""))]
-        elif "-" in year:
-            albums = [x for x in albums if x["year"] <= int(year.replace("-", ""))]
-
-    if rating is not None:
-        albums = [x for x in albums if x["rating"] == int(rating)]
-        if "=" in rating:
-            albums = [x for x in albums if x["rating"] == int(rating.replace("=", ""))]
-        elif "+" in rating:
-            albums = [x for x in albums if x["rating"] >= int(rating.replace("+", ""))]
-        elif "-" in rating:
-            albums = [x for x in albums if x["rating"] <= int(rating.replace("-", ""))]
-
-    if tags is not None:
-        query_tags = set(tags.split(","))
-        albums = [x for x in albums if query_tags.issubset(set(x["tags"]))]
-
-    if sort is not None:
-        reverse = not ascending if ascending is not None else True
-        albums = sorted(albums, key=lambda x: x[sort], reverse=reverse)
-
-    for album in albums:
-        click.echo(ui.style_album(album["artist"], album["album"], album["year"]))
-
-
 if __name__ == "__main__":
     main()
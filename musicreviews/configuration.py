@@ -1,10 +1,84 @@
 import os
+from collections.abc import Mapping
 from configparser import ConfigParser
+from types import MappingProxyType
 
 import click
-from pkg_resources import Requirement, resource_filename
 
-from .writer import write_file
+try:
+    from importlib.resources import files
+except ImportError:
+    from importlib_resources import files
+
+
+class Config(Mapping):
+    """Immutable configuration, mapping each section name to a read-only mapping
+    of its fields. Values are strings, converted by the typed getters like in
+    ConfigParser. Tag descriptions are precomputed for the indexers, indexed by
+    lowercase tag as fields are case-insensitive.
+    """
+
+    def __init__(self, sections):
+        self.sections = MappingProxyType(
+            {name: Section(fields) for name, fields in sections.items()}
+        )
+        self.tag_descriptions = MappingProxyType(dict(self.sections.get("tags", {})))
+
+    @classmethod
+    def from_parser(cls, parser):
+        """Builds a configuration from the sections of a ConfigParser."""
+        return cls({name: dict(parser[name]) for name in parser.sections()})
+
+    def __reduce__(self):
+        # read-only proxies can't be pickled, the configuration is built again
+        return (Config, ({name: dict(section) for name, section in self.items()},))
+
+    def __getitem__(self, name):
+        return self.sections[name]
+
+    def __iter__(self):
+        return iter(self.sections)
+
+    def __len__(self):
+        return len(self.sections)
+
+    def getint(self, section, field, fallback=None):
+        """Returns the field converted to an integer, or fallback if missing."""
+        if field not in self.sections.get(section, {}):
+            return fallback
+        return int(self.sections[section][field])
+
+    def getboolean(self, section, field, fallback=None):
+        """Returns the field converted to a boolean, or fallback if missing."""
+        if field not in self.sections.get(section, {}):
+            return fallback
+        value = self.sections[section][field].lower()
+        if value not in ConfigParser.BOOLEAN_STATES:
+            raise ValueError(f"Not a boolean: {value}")
+        return ConfigParser.BOOLEAN_STATES[value]
+
+
+class Section(Mapping):
+    """Read-only mapping of the fields of a configuration section.
+    Fields are case-insensitive, like in ConfigParser.
+    """
+
+    def __init__(self, fields):
+        self.fields = MappingProxyType(
+            {field.lower(): value for field, value in fields.items()}
+        )
+
+    def __reduce__(self):
+        return (Section, (dict(self.fields),))
+
+    def __getitem__(self, field):
+        return self.fields[field.lower()]
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
 
 
 def write_config(config):
@@ -19,12 +93,11 @@ def write_config(config):
 
 def copy_template_html(export_dir):
     """Copies the HTML/CSS template files to the export directory."""
+    # the writer and its formatters are only imported by the setup command
+    from .writer import write_file
+
     for name in ["template.html", "template_index.html", "style.css"]:
-        template_path = resource_filename(
-            Requirement.parse(__package__), "templates/" + name
-        )
-        with open(template_path) as file_content:
-            template = file_content.read()
+        template = read_package_template(name)
         write_path = os.path.join(export_dir, name)
         write_file(template, write_path)
     return export_dir
@@ -32,18 +105,24 @@ def copy_template_html(export_dir):
 
 def copy_template_review(root_dir):
     """Copies the template review to the reviews library directory."""
-    template_path = resource_filename(
-        Requirement.parse(__package__), "templates/template.md"
-    )
-    with open(template_path) as file_content:
-        template = file_content.read()
+    from .writer import write_file
+
+    template = read_package_template("template.md")
     write_path = os.path.join(root_dir, "template.md")
     write_file(template, write_path)
     return write_path
 
 
-def load_config(load_template=False):
-    """Loads configuration and returns path and configuration object."""
+def load_config():
+    """Loads configuration and returns path and immutable configuration, or None
+    if there is no configuration.
+    """
+    path, parser = read_config()
+    return path, Config.from_parser(parser) if parser is not None else None
+
+
+def read_config(load_template=False):
+    """Reads configuration and returns path and editable configuration parser."""
     config = ConfigParser()
     path = template_config_path() if load_template else config_path()
     if os.path.exists(path):
@@ -55,9 +134,17 @@ def load_config(load_template=False):
 
 def template_config_path():
     """Returns path to package template configuration."""
-    return resource_filename(
-        Requirement.parse(__package__), "templates/config.template.cfg"
-    )
+    return package_template_path("config.template.cfg")
+
+
+def package_template_path(name):
+    """Returns path to a template file shipped with the package."""
+    return str(files(__package__) / "templates" / name)
+
+
+def read_package_template(name):
+    """Reads a template file shipped with the package and returns its content."""
+    return (files(__package__) / "templates" / name).read_text(encoding="utf8")
 
 
 def config_path():
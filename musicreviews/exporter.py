@@ -0,0 +1,210 @@
+"""
+Functions for exporting the whole reviews library to HTML.
+A manifest in the export directory records the state of the sources of each
+exported file, so that only reviews and artist indexes that are out of date
+are exported again.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import click
+
+from . import timing
+from .indexer import ALBUM_FIELDS, group_albums, index_inputs_digest
+from .reader import copy_album, read_template
+from .ui import style_info
+from .writer import WriteTransaction, export_artist_index, export_review, file_digest
+
+MANIFEST_FILENAME = ".musicreviews_export.json"
+# below this number of files to export, a process pool costs more than it saves
+PARALLEL_MIN_FILES = 100
+
+
+def settings_digest(templates, base_url=None):
+    """Returns a digest of the inputs shared by all exported files:
+    the HTML templates and the base URL.
+    """
+    digest = hashlib.sha1(repr(base_url).encode())
+    for template in templates:
+        digest.update(template.encode())
+    return digest.hexdigest()
+
+
+def load_manifest(root):
+    """Returns the manifest of the last export, or an empty one."""
+    try:
+        with open(os.path.join(root, MANIFEST_FILENAME), encoding="utf8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault("settings", None)
+    manifest.setdefault("reviews", {})
+    manifest.setdefault("artists", {})
+    return manifest
+
+
+def review_state(source_path, previous_state=None):
+    """Returns the modification time, size and digest of a review source file.
+    The digest of the previous state is reused if time and size are unchanged.
+    """
+    stat = os.stat(source_path)
+    state = [stat.st_mtime_ns, stat.st_size]
+    if previous_state is not None and previous_state[:2] == state:
+        return previous_state
+    return state + [file_digest(source_path)]
+
+
+def remove_output(root, folder, filename):
+    """Removes an exported file, and its folder if it is left empty."""
+    try:
+        os.remove(os.path.join(root, folder, filename))
+        os.rmdir(os.path.join(root, folder))
+    except OSError:
+        pass
+
+
+def map_exports(
+    function, data, root, base_url, template, workers=None, transaction=None
+):
+    """Calls the export function on each element of data, over a process pool if
+    workers is set. Yields the elements in order once they are exported.
+    Files are written through the write transaction, or through a transaction per
+    element in worker processes.
+    """
+    if workers is None or workers <= 1 or len(data) < PARALLEL_MIN_FILES:
+        for element in data:
+            function(
+                element,
+                root=root,
+                base_url=base_url,
+                template=template,
+                transaction=transaction,
+            )
+            yield element
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            export_task,
+            repeat(function),
+            data,
+            repeat(root),
+            repeat(base_url),
+            repeat(template),
+            chunksize=max(1, len(data) // (4 * workers)),
+        )
+        for element, __ in zip(data, results):
+            yield element
+
+
+def export_task(function, element, root, base_url, template):
+    """Calls the export function in a worker process."""
+    with WriteTransaction() as transaction:
+        function(
+            element,
+            root=root,
+            base_url=base_url,
+            template=template,
+            transaction=transaction,
+        )
+
+
+def export_library(albums, source_root, root, base_url=None, force=False, workers=None):
+    """Exports all reviews and artist indexes to HTML in the root directory.
+    Reviews whose source and templates did not change since the last export are
+    skipped, as well as artist indexes whose albums did not change, unless force
+    is set. Exported files of deleted reviews and artists are removed.
+    Files are rendered and written over a pool of worker processes if workers is set.
+    Files are written atomically, and unchanged files are left untouched.
+    Returns the number of skipped files.
+    """
+    # templates are read once and handed to all exports
+    review_template = read_template(root, "template.html")
+    index_template = read_template(root, "template_index.html")
+    manifest = load_manifest(root)
+    settings = settings_digest([review_template, index_template], base_url)
+    # everything is exported again if shared inputs changed
+    outdated = force or manifest["settings"] != settings
+    skipped = 0
+
+    with timing.phase("export check reviews"):
+        reviews = {}
+        stale_albums = []
+        for album in albums:
+            name = f"{album['artist_tag']}/{album['album_tag']}"
+            source_path = os.path.join(
+                source_root, album["artist_tag"], album["album_tag"] + ".md"
+            )
+            previous_state = manifest["reviews"].get(name)
+            reviews[name] = review_state(source_path, previous_state)
+            output_path = os.path.join(root, album["artist_tag"], album["album_tag"])
+            if (
+                not outdated
+                and previous_state is not None
+                and previous_state[2] == reviews[name][2]
+                and os.path.exists(output_path + ".html")
+            ):
+                skipped += 1
+                continue
+            # exporting formats the fields in place, albums are used afterwards
+            stale_albums.append(copy_album(album))
+    # folders are created beforehand so that workers don't race to create them
+    for artist_tag in set(album["artist_tag"] for album in stale_albums):
+        os.makedirs(os.path.join(root, artist_tag), exist_ok=True)
+    with WriteTransaction() as transaction:
+        exports = map_exports(
+            export_review,
+            stale_albums,
+            root,
+            base_url,
+            review_template,
+            workers,
+            transaction,
+        )
+        with timing.phase("export reviews"):
+            for i, album in enumerate(exports):
+                name = f"{album['artist_tag']}/{album['album_tag']}"
+                click.echo(style_info(f"{i + 1}/{len(stale_albums)} {name}"))
+        for name in manifest["reviews"].keys() - reviews.keys():
+            click.echo(style_info(f"Removing {name}"))
+            artist_tag, album_tag = name.split("/")
+            remove_output(root, artist_tag, album_tag + ".html")
+
+        with timing.phase("export check artists"):
+            artists = {}
+            stale_artists = []
+            for artist_tag, artist_albums in group_albums(albums)["artist"].items():
+                artists[artist_tag] = index_inputs_digest(artist_albums, ALBUM_FIELDS)
+                if (
+                    not outdated
+                    and manifest["artists"].get(artist_tag) == artists[artist_tag]
+                    and os.path.exists(os.path.join(root, artist_tag, "index.html"))
+                ):
+                    skipped += 1
+                    continue
+                stale_artists.append(artist_albums)
+        exports = map_exports(
+            export_artist_index,
+            stale_artists,
+            root,
+            base_url,
+            index_template,
+            workers,
+            transaction,
+        )
+        with timing.phase("export artist indexes"):
+            for i, artist_albums in enumerate(exports):
+                name = f"{artist_albums[0]['artist_tag']}/index"
+                click.echo(style_info(f"{i + 1}/{len(stale_artists)} {name}"))
+        for artist_tag in manifest["artists"].keys() - artists.keys():
+            remove_output(root, artist_tag, "index.html")
+
+        # the manifest is moved into place last, once all exported files are
+        transaction.write(
+            json.dumps({"settings": settings, "reviews": reviews, "artists": artists}),
+            os.path.join(root, MANIFEST_FILENAME),
+        )
+    return skipped
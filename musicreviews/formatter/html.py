@@ -9,13 +9,121 @@ import re
 
 from . import utils
 
+# tokens of the markdown subset, each starting with a distinct character so that
+# text between tokens is skipped quickly: bold or italic text without markers,
+# escaped character, run of emphasis markers, paragraph break, escaped braces and
+# field reference like {4} or {artist}
+MARKDOWN_TOKEN = re.compile(
+    r"\*\*([^\s*\\{}][^*\\{}\n]*?(?<=\S))\*\*(?!\*)"
+    r"|\*([^\s*\\{}][^*\\{}\n]*?(?<=\S))\*(?!\*)"
+    r"|\\([\\*{}])|\*(\**)|\n(\n)|\{(\{)|\}(\})|\{(\w+)\}"
+)
+# index of the group matched by each kind of token, escaped braces being the others
+BOLD, ITALIC, ESCAPED, STARS, PARAGRAPH, FIELD = 1, 2, 3, 4, 5, 8
+EMPHASIS_TAGS = {"*": ("<i>", "</i>"), "**": ("<b>", "</b>")}
 
-def markdown_to_html(string):
-    """Translates the string from markdown format to HTML."""
-    string = utils.replace_enclosed_text_tags(string, r"\*\*", "<b>", "</b>")
-    string = utils.replace_enclosed_text_tags(string, r"\*", "<i>", "</i>")
-    string = re.sub("\n\n", "</p><p>", string)
-    return string
+
+def markdown_to_html(string, fields=None):
+    """Translates the string from markdown format to HTML in a single scan.
+    Bold and italic text may be nested but not span paragraphs. Markers are
+    kept as text when escaped with a backslash, left unclosed, surrounded by
+    spaces or in runs of more than 3.
+    With fields, references like {4} are replaced by the track 4 in italic and
+    references like {artist} by the field value, double braces by single ones.
+    """
+    pieces = []
+    # emphasis markers opened, and the index of their piece
+    opened = []
+    position = 0
+    for match in MARKDOWN_TOKEN.finditer(string):
+        start, end = match.span()
+        if start > position:
+            pieces.append(string[position:start])
+        position = end
+        token = match.lastindex
+        if token == BOLD or token == ITALIC:
+            marker = "**" if token == BOLD else "*"
+            if not opened:
+                opening, closing = EMPHASIS_TAGS[marker]
+                pieces.append(opening + match.group(token) + closing)
+                continue
+            # the markers may close emphasis opened before
+            add_emphasis(marker, pieces, opened, True, closes_emphasis(string, start))
+            pieces.append(match.group(token))
+            add_emphasis(marker, pieces, opened, opens_emphasis(string, end), True)
+        elif token == STARS:
+            add_emphasis(
+                match.group(),
+                pieces,
+                opened,
+                opens_emphasis(string, end),
+                closes_emphasis(string, start),
+            )
+        elif token == PARAGRAPH:
+            pieces.append("</p><p>")
+            # markers left open stay as text
+            opened.clear()
+        elif token == ESCAPED:
+            pieces.append(match.group(token))
+        elif fields is None:
+            pieces.append(match.group())
+        elif token == FIELD:
+            pieces.append(format_field(match.group(token), fields, match.group()))
+        else:
+            pieces.append(match.group(token))
+    pieces.append(string[position:])
+    return "".join(pieces)
+
+
+def opens_emphasis(string, end):
+    """Returns whether the emphasis markers ending at end are followed by text."""
+    return end < len(string) and not string[end].isspace()
+
+
+def closes_emphasis(string, start):
+    """Returns whether the emphasis markers starting at start follow text."""
+    return start > 0 and not string[start - 1].isspace()
+
+
+def add_emphasis(stars, pieces, opened, can_open=True, can_close=True):
+    """Closes the emphasis opened by the last markers with a run of stars, then
+    opens emphasis with the remaining stars.
+    """
+    if len(stars) > 3:
+        pieces.append(stars)
+        return
+    count = len(stars)
+    # emphasis is only closed around some text
+    while (
+        can_close
+        and opened
+        and len(opened[-1][0]) <= count
+        and opened[-1][1] < len(pieces) - 1
+    ):
+        marker, index = opened.pop()
+        opening, closing = EMPHASIS_TAGS[marker]
+        pieces[index] = opening
+        pieces.append(closing)
+        count -= len(marker)
+    if count == 0:
+        return
+    if not can_open:
+        pieces.append("*" * count)
+        return
+    for marker in ["**", "*"] if count == 3 else ["*" * count]:
+        # the marker is kept as text unless it is closed
+        pieces.append(marker)
+        opened.append((marker, len(pieces) - 1))
+
+
+def format_field(name, fields, reference):
+    """Returns the track or field value a reference stands for, or the reference
+    itself if it is unknown.
+    """
+    if name.isdigit():
+        track = (fields.get("tracks") or {}).get(int(name))
+        return reference if track is None else f"<i>{track}</i>"
+    return format(fields[name]) if name in fields else reference
 
 
 def rating_to_rbg_color(rating):
@@ -74,6 +182,15 @@ def parse_list(data, formatter, index_shift=1):
     return output
 
 
+def iter_list(data, formatter, index_shift=1):
+    """Yields each element in data parsed using a formatter function.
+    Data is a list of dicts.
+    """
+    yield "<ul>\n"
+    yield from utils.iter_list(data, formatter, index_shift)
+    yield "</ul>\n"
+
+
 def parse_categorised_lists(
     data,
     header_formatter,
@@ -98,6 +215,29 @@ def parse_categorised_lists(
     return output
 
 
+def iter_categorised_lists(
+    data,
+    header_formatter,
+    formatter,
+    descriptions=None,
+    description_formatter=None,
+    sorted_keys=None,
+):
+    """Yields each element in data parsed using a formatter function.
+    Data is a dict, each key is a category and each value is a list of dicts.
+    Yields a header before each category.
+    """
+    return utils.iter_categorised_lists(
+        data,
+        header_formatter,
+        formatter,
+        iter_list,
+        descriptions,
+        description_formatter,
+        sorted_keys,
+    )
+
+
 def format_header(string):
     """Returns the string as a header in HTML format."""
     return f"<h1 id='{string}'>{string}</h1>\n"
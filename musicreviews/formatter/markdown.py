@@ -5,6 +5,7 @@ Formatters take an integer index and a dictionary as inputs.
 
 from . import utils
 
+iter_list = utils.iter_list
 parse_list = utils.parse_list
 
 
@@ -32,6 +33,29 @@ def parse_categorised_lists(
     return output
 
 
+def iter_categorised_lists(
+    data,
+    header_formatter,
+    formatter,
+    descriptions=None,
+    description_formatter=None,
+    sorted_keys=None,
+):
+    """Yields each element in data parsed using a formatter function.
+    Data is a dict, each key is a category and each value is a list of dicts.
+    Yields a header before each category.
+    """
+    return utils.iter_categorised_lists(
+        data,
+        header_formatter,
+        formatter,
+        iter_list,
+        descriptions,
+        description_formatter,
+        sorted_keys,
+    )
+
+
 def format_header(string):
     """Returns the string as a header."""
     return "\n# {}\n\n".format(string)
@@ -4,16 +4,54 @@ Helpers for review and index formatting.
 """
 
 import re
+from functools import lru_cache
+
+NON_ALPHANUMERIC = re.compile("[^a-zA-Z0-9]")
+TRACK_TAG = re.compile(r"{(\d+)}")
+# strings matching these patterns need quotes in YAML
+YAML_DOUBLE_QUOTE = re.compile('^"')
+YAML_SPECIALS = re.compile(r"^'|^\? |: |^,|^&|^%|^@|^!|^\||^\*|^#|^- |^[|^]|^{|^}|^>")
+
+
+def iter_list(data, formatter, index_shift=1):
+    """Yields each element in data parsed using a formatter function.
+    Data is a list of dicts.
+    """
+    for i, item in enumerate(data):
+        yield formatter(i + index_shift, item)
 
 
 def parse_list(data, formatter, index_shift=1):
     """Parses each element in data using a formatter function.
     Data is a list of dicts.
     """
-    output = "".join([formatter(i + index_shift, item) for i, item in enumerate(data)])
+    output = "".join(iter_list(data, formatter, index_shift))
     return output
 
 
+def iter_categorised_lists(
+    data,
+    header_formatter,
+    formatter,
+    list_iterator,
+    descriptions=None,
+    description_formatter=None,
+    sorted_keys=None,
+):
+    """Yields each element in data parsed using a formatter function.
+    Data is a dict, each key is a category and each value is a list of dicts.
+    Yields a header before each category.
+    """
+    if sorted_keys is None:
+        sorted_keys = sorted(data.keys(), reverse=True)
+    with_descriptions = descriptions is not None and description_formatter is not None
+    for key in sorted_keys:
+        yield header_formatter(key)
+        if with_descriptions:
+            yield description_formatter(descriptions[key])
+        yield from list_iterator(data[key], formatter)
+
+
 def parse_categorised_lists(
     data,
     header_formatter,
@@ -48,11 +86,22 @@ def parse_categorised_lists(
     return output
 
 
+def iter_template(template, content, **fields):
+    """Fills the template with the fields and yields it in chunks, the chunks of
+    content being yielded in place of the content field.
+    """
+    # a separator that can't be in the template marks where the content goes
+    head, tail = template.format(content="\0", **fields).split("\0", 1)
+    yield head
+    yield from content
+    yield tail
+
+
 def alphanumeric_lowercase(string):
     """Returns a lowercase version of the string with non-alphanumeric
     characters stripped out.
     """
-    return re.sub("[^a-zA-Z0-9]", "", string).lower()
+    return NON_ALPHANUMERIC.sub("", string).lower()
 
 
 def replace_enclosed_text_tags(string, tag_to_sub, opening_tag, closing_tag=None):
@@ -60,15 +109,21 @@ def replace_enclosed_text_tags(string, tag_to_sub, opening_tag, closing_tag=None
     For example _test_ -> **test** or <b>test</b>
     """
     closing_tag = closing_tag or opening_tag
-    string = re.sub(
-        "{0}([^{0}]+){0}".format(tag_to_sub), f"{opening_tag}\\1{closing_tag}", string
+    string = enclosed_text_pattern(tag_to_sub).sub(
+        f"{opening_tag}\\1{closing_tag}", string
     )
     return string
 
 
+@lru_cache(maxsize=None)
+def enclosed_text_pattern(tag):
+    """Returns the compiled pattern of text enclosed in the tag."""
+    return re.compile("{0}([^{0}]+){0}".format(tag))
+
+
 def replace_track_tags(content):
     """Replaces tags like {4} to formatting compatible tags like {tracks[4]}."""
-    return re.sub(r"{(\d+)}", "<i>{tracks[\\1]}</i>", content)
+    return TRACK_TAG.sub("<i>{tracks[\\1]}</i>", content)
 
 
 def escape_yaml_specials(string):
@@ -76,11 +131,9 @@ def escape_yaml_specials(string):
     alpha_string = alphanumeric_lowercase(string)
     if alpha_string == "yes" or alpha_string == "no":
         return '"' + string + '"'
-    elif bool(re.search('^"', string)):
+    elif YAML_DOUBLE_QUOTE.search(string):
         return "'" + string + "'"
-    elif bool(
-        re.search(r"^'|^\? |: |^,|^&|^%|^@|^!|^\||^\*|^#|^- |^[|^]|^{|^}|^>", string)
-    ):
+    elif YAML_SPECIALS.search(string):
         return '"' + string + '"'
     else:
         return string
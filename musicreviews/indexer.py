@@ -1,16 +1,25 @@
 """
 Functions for generating various sorted lists and indexes of the reviews and ratings.
-Each indexer function returns parsed data as a formatted string in wanted format
-(markdown or HTML).
+Each indexer function returns parsed data as an iterator of formatted chunks in
+wanted format (markdown or HTML), so that indexes are written without being built
+in memory.
 """
 
+import hashlib
+import json
 import os
+from collections import defaultdict
 from datetime import date, timedelta
-from itertools import chain
 
-from .configuration import load_config
-from .reader import read_file
-from .writer import write_file
+from . import timing
+from .formatter.utils import iter_template
+from .reader import read_template
+from .writer import WriteTransaction
+
+MANIFEST_FILENAME = ".musicreviews_indexes.json"
+
+# album fields holding several values, and the name of the grouping they define
+MULTIVALUED_GROUPS = (("tags", "tag"), ("producers", "producer"), ("labels", "label"))
 
 
 def compute_artist_rating(ratings):
@@ -18,30 +27,55 @@ def compute_artist_rating(ratings):
     return float(sum(ratings)) / max(len(ratings), 1)
 
 
-def artists_by_name(formatter, albums):
+def group_albums(albums):
+    """Groups the albums by artist tag, year, decade, tag, producer and label
+    in a single pass. Returns a dict mapping each grouping name to a dict of
+    group key -> list of albums, keeping the order of the albums in each group.
+    """
+    groups = {
+        "artist": defaultdict(list),
+        "year": defaultdict(list),
+        "decade": defaultdict(list),
+        "tag": defaultdict(list),
+        "producer": defaultdict(list),
+        "label": defaultdict(list),
+    }
+    for album in albums:
+        groups["artist"][album["artist_tag"]].append(album)
+        groups["year"][album["year"]].append(album)
+        groups["decade"][album["decade"]].append(album)
+        for field, name in MULTIVALUED_GROUPS:
+            # optional fields -> may be None
+            if album[field] is not None:
+                for key in set(album[field]):
+                    groups[name][key].append(album)
+    return {name: dict(group) for name, group in groups.items()}
+
+
+def artists_by_name(formatter, albums, groups=None, config=None):
     """Returns the artists sorted by name."""
-    artist_tags = set([album["artist_tag"] for album in albums])
+    if groups is None:
+        groups = group_albums(albums)
     artists = []
-    for artist_tag in sorted(artist_tags):
-        specific_albums = [x for x in albums if x["artist_tag"] == artist_tag]
+    for artist_tag, specific_albums in sorted(groups["artist"].items()):
         artists.append(
             {
                 "artist_tag": artist_tag,
                 "artist": specific_albums[0]["artist"],
             }
         )
-    return formatter.parse_list(artists, formatter.format_artist)
+    return formatter.iter_list(artists, formatter.format_artist)
 
 
-def artists_by_rating(formatter, albums):
+def artists_by_rating(formatter, albums, groups=None, config=None):
     """Returns the artists sorted by decreasing mean album rating.
     Only artists with more than 1 reviewed albums are considered.
     """
-    artist_tags = set([album["artist_tag"] for album in albums])
+    if groups is None:
+        groups = group_albums(albums)
     artists = []
     # build the list of artists and compute their ratings
-    for artist_tag in artist_tags:
-        specific_albums = [x for x in albums if x["artist_tag"] == artist_tag]
+    for artist_tag, specific_albums in groups["artist"].items():
         if len(specific_albums) > 1:
             rating = compute_artist_rating([x["rating"] for x in specific_albums])
             artists.append(
@@ -54,92 +88,92 @@ def artists_by_rating(formatter, albums):
     sorted_artists = sorted(
         artists, key=lambda x: (x["rating"], x["artist_tag"]), reverse=True
     )
-    return formatter.parse_list(sorted_artists, formatter.format_artist_rating)
+    return formatter.iter_list(sorted_artists, formatter.format_artist_rating)
 
 
-def albums_by_rating(formatter, albums):
+def albums_by_rating(formatter, albums, groups=None, config=None):
     """Returns the rated albums sorted by decreasing rating."""
     sorted_albums = sorted(
         albums,
         key=lambda x: (x["rating"], x["artist_tag"], x["album_tag"]),
         reverse=True,
     )
-    return formatter.parse_list(sorted_albums, formatter.format_album)
+    return formatter.iter_list(sorted_albums, formatter.format_album)
 
 
-def albums_by_year(formatter, albums):
+def albums_by_year(formatter, albums, groups=None, config=None):
     """Returns the rated albums sorted by decreasing year and rating."""
-    years = set([album["year"] for album in albums])
+    if groups is None:
+        groups = group_albums(albums)
     sorted_albums = {}
-    for year in sorted(years, reverse=True):
+    for year, year_albums in sorted(groups["year"].items(), reverse=True):
         sorted_albums[year] = sorted(
-            [x for x in albums if x["year"] == year],
+            year_albums,
             key=lambda x: (x["rating"], x["artist_tag"], x["album_tag"]),
             reverse=True,
         )
-    return formatter.parse_categorised_lists(
+    return formatter.iter_categorised_lists(
         sorted_albums, formatter.format_header, formatter.format_album
     )
 
 
-def albums_by_decade(formatter, albums):
+def albums_by_decade(formatter, albums, groups=None, config=None):
     """Returns the rated albums sorted by decreasing decade and rating."""
-    decades = set([album["decade"] for album in albums])
+    if groups is None:
+        groups = group_albums(albums)
     sorted_albums = {}
-    for decade in sorted(decades, reverse=True):
+    for decade, decade_albums in sorted(groups["decade"].items(), reverse=True):
         sorted_albums[decade] = sorted(
-            [x for x in albums if x["decade"] == decade],
+            decade_albums,
             key=lambda x: (x["rating"], x["artist_tag"], x["album_tag"]),
             reverse=True,
         )
-    return formatter.parse_categorised_lists(
+    return formatter.iter_categorised_lists(
         sorted_albums, formatter.format_header, formatter.format_album
     )
 
 
-def albums_by_name(formatter, albums):
+def albums_by_name(formatter, albums, groups=None, config=None):
     """Returns a list of all album reviews sorted by artist and name."""
     sorted_albums = sorted(albums, key=lambda x: (x["artist_tag"], x["album_tag"]))
-    return formatter.parse_list(sorted_albums, formatter.format_album)
+    return formatter.iter_list(sorted_albums, formatter.format_album)
 
 
-def albums_by_date(formatter, albums):
+def albums_by_date(formatter, albums, groups=None, config=None):
     """Returns the reviews sorted by generation date."""
     sorted_albums = sorted(
         albums, key=lambda x: (x["date"], x["artist_tag"], x["album_tag"]), reverse=True
     )
-    return formatter.parse_list(sorted_albums, formatter.format_album)
+    return formatter.iter_list(sorted_albums, formatter.format_album)
 
 
-def albums_by_length(formatter, albums):
+def albums_by_length(formatter, albums, groups=None, config=None):
     """Returns the reviews sorted by content length."""
     sorted_albums = sorted(
         albums,
-        key=lambda x: (len(x["content"]), x["artist_tag"], x["album_tag"]),
+        key=lambda x: (x["length"], x["artist_tag"], x["album_tag"]),
         reverse=True,
     )
-    return formatter.parse_list(sorted_albums, formatter.format_album)
+    return formatter.iter_list(sorted_albums, formatter.format_album)
 
 
-def tags_by_name(formatter, albums):
+def tags_by_name(formatter, albums, groups=None, config=None):
     """Returns for each tag's albums sorted by decreasing rating."""
-    tags = sorted(
-        set(
-            chain.from_iterable(
-                [album["tags"] for album in albums if album["tags"] is not None]
-            )
-        )
-    )
+    if groups is None:
+        groups = group_albums(albums)
+    tags = sorted(groups["tag"])
     sorted_albums = {}
     descriptions = {}
-    __, config = load_config()
+    # without configuration, tags have no description
+    tag_descriptions = config.tag_descriptions if config is not None else {}
     for tag in tags:
-        descriptions[tag] = config["tags"].get(tag, "")
+        # configuration fields are lowercase
+        descriptions[tag] = tag_descriptions.get(str(tag).lower(), "")
         sorted_albums[tag] = sorted(
-            [x for x in albums if x["tags"] is not None and tag in x["tags"]],
+            groups["tag"][tag],
             key=lambda x: (x["artist_tag"], x["album_tag"]),
         )
-    return formatter.parse_categorised_lists(
+    return formatter.iter_categorised_lists(
         sorted_albums,
         formatter.format_header,
         formatter.format_album,
@@ -149,30 +183,18 @@ def tags_by_name(formatter, albums):
     )
 
 
-def producers_by_name(formatter, albums):
+def producers_by_name(formatter, albums, groups=None, config=None):
     """Returns for each producer's albums sorted by decreasing rating."""
-    producers = sorted(
-        set(
-            chain.from_iterable(
-                [
-                    album["producers"]
-                    for album in albums
-                    if album["producers"] is not None
-                ]
-            )
-        )
-    )
+    if groups is None:
+        groups = group_albums(albums)
+    producers = sorted(groups["producer"])
     sorted_albums = {}
     for producer in producers:
         sorted_albums[producer] = sorted(
-            [
-                x
-                for x in albums
-                if x["producers"] is not None and producer in x["producers"]
-            ],
+            groups["producer"][producer],
             key=lambda x: (x["artist_tag"], x["album_tag"]),
         )
-    return formatter.parse_categorised_lists(
+    return formatter.iter_categorised_lists(
         sorted_albums,
         formatter.format_header,
         formatter.format_album,
@@ -180,22 +202,18 @@ def producers_by_name(formatter, albums):
     )
 
 
-def labels_by_name(formatter, albums):
+def labels_by_name(formatter, albums, groups=None, config=None):
     """Returns for each label's albums sorted by decreasing rating."""
-    labels = sorted(
-        set(
-            chain.from_iterable(
-                [album["labels"] for album in albums if album["labels"] is not None]
-            )
-        )
-    )
+    if groups is None:
+        groups = group_albums(albums)
+    labels = sorted(groups["label"])
     sorted_albums = {}
     for label in labels:
         sorted_albums[label] = sorted(
-            [x for x in albums if x["labels"] is not None and label in x["labels"]],
+            groups["label"][label],
             key=lambda x: (x["artist_tag"], x["album_tag"]),
         )
-    return formatter.parse_categorised_lists(
+    return formatter.iter_categorised_lists(
         sorted_albums,
         formatter.format_header,
         formatter.format_album,
@@ -203,7 +221,7 @@ def labels_by_name(formatter, albums):
     )
 
 
-def shopping_list(formatter, albums):
+def shopping_list(formatter, albums, groups=None, config=None):
     """Returns classics and favorites not physically owned."""
     filtered_albums = [
         x
@@ -214,12 +232,12 @@ def shopping_list(formatter, albums):
     sorted_albums = sorted(
         filtered_albums,
         key=lambda x: (x["date"], x["artist_tag"], x["album_tag"]),
-        reverse=True
+        reverse=True,
     )
-    return formatter.parse_list(sorted_albums, formatter.format_album)
+    return formatter.iter_list(sorted_albums, formatter.format_album)
 
 
-def recent_albums(formatter, albums):
+def recent_albums(formatter, albums, groups=None, config=None):
     """Returns albums reviewed over the last 6 months sorted by decreasing rating."""
     filtered_albums = [
         x for x in albums if x["date"] > date.today() - timedelta(days=183)
@@ -229,37 +247,106 @@ def recent_albums(formatter, albums):
         key=lambda x: (x["rating"], x["artist_tag"], x["album_tag"]),
         reverse=True,
     )
-    return formatter.parse_list(sorted_albums, formatter.format_album)
-
-
-def generate_all_indexes(albums, root_dir, extension="md", base_url=None):
-    """Writes all possible indexes format."""
+    return formatter.iter_list(sorted_albums, formatter.format_album)
+
+
+def index_inputs_digest(albums, fields, extra=None):
+    """Returns a digest of the given fields of the albums, and of extra inputs."""
+    entries = sorted(repr(tuple(album[field] for field in fields)) for album in albums)
+    digest = hashlib.sha1(repr(extra).encode())
+    for entry in entries:
+        digest.update(entry.encode())
+    return digest.hexdigest()
+
+
+def load_manifest(root_dir):
+    """Returns the digests of the inputs of the last generated indexes."""
+    try:
+        with open(os.path.join(root_dir, MANIFEST_FILENAME), encoding="utf8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def generate_all_indexes(
+    albums, root_dir, extension="md", base_url=None, incremental=False, config=None
+):
+    """Writes all possible indexes format.
+    With incremental, only the indexes whose inputs changed since the last run
+    are generated. Files are written atomically, only if their content changed.
+    The configuration provides the tag descriptions. Returns the names of the
+    written indexes.
+    """
     if extension == "html":
         formatter = __import__("musicreviews").formatter.html
+        index_template = read_template(root_dir, "template_index.html")
     else:
         formatter = __import__("musicreviews").formatter.markdown
-    pipelines = (
-        (albums_by_rating, "albumsrating"),
-        (albums_by_year, "years"),
-        (albums_by_decade, "decades"),
-        (albums_by_name, "albums"),
-        (albums_by_date, "albumsdate"),
-        (albums_by_length, "albumslength"),
-        (producers_by_name, "producers"),
-        (labels_by_name, "labels"),
-        (tags_by_name, "tags"),
-        (artists_by_name, "artists"),
-        (artists_by_rating, "artistsrating"),
-        (shopping_list, "shopping_list"),
-        (recent_albums, "recent_albums"),
-    )
-    for function, index_name in pipelines:
-        content = function(formatter, albums)
-        # specific case for html: fill an html template
-        if extension == "html":
-            index_template = read_file(root_dir, "template_index.html")
-            title = index_name.replace("_", " ").title()
-            content = index_template.format(
-                title=title, base_url=base_url, content=content
+        index_template = None
+    tag_descriptions = config.tag_descriptions if config is not None else None
+    # inputs of the indexes besides the albums fields
+    extra_inputs = {
+        "tags": sorted(tag_descriptions.items()) if config is not None else None,
+        "recent_albums": date.today().isoformat(),
+    }
+    manifest = load_manifest(root_dir) if incremental else {}
+    digests = manifest.get(extension, {})
+    groups = None
+    written = []
+    with WriteTransaction() as transaction:
+        for function, index_name, fields in INDEX_PIPELINES:
+            path = os.path.join(root_dir, f"{index_name}.{extension}")
+            digest = index_inputs_digest(
+                albums,
+                fields,
+                (extension, base_url, index_template, extra_inputs.get(index_name)),
             )
-        write_file(content, os.path.join(root_dir, f"{index_name}.{extension}"))
+            if (
+                incremental
+                and digests.get(index_name) == digest
+                and os.path.exists(path)
+            ):
+                continue
+            if groups is None:
+                # groups are shared by all indexes instead of being rebuilt by each one
+                with timing.phase("index groups"):
+                    groups = group_albums(albums)
+            with timing.phase(f"index {extension} {index_name}"):
+                content = function(formatter, albums, groups=groups, config=config)
+                # specific case for html: fill an html template
+                if extension == "html":
+                    title = index_name.replace("_", " ").title()
+                    content = iter_template(
+                        index_template, content, title=title, base_url=base_url
+                    )
+                # unchanged files are not written, but count as written when forced
+                if transaction.write(content, path) or not incremental:
+                    written.append(index_name)
+            digests[index_name] = digest
+        manifest[extension] = digests
+        # the manifest is moved into place last, once all indexes are
+        transaction.write(
+            json.dumps(manifest), os.path.join(root_dir, MANIFEST_FILENAME)
+        )
+    return written
+
+
+# fields of the albums displayed by the album formatters
+ALBUM_FIELDS = ("artist_tag", "album_tag", "artist", "album", "year", "rating")
+
+# index function, index name and album fields the index depends on
+INDEX_PIPELINES = (
+    (albums_by_rating, "albumsrating", ALBUM_FIELDS),
+    (albums_by_year, "years", ALBUM_FIELDS),
+    (albums_by_decade, "decades", ALBUM_FIELDS + ("decade",)),
+    (albums_by_name, "albums", ALBUM_FIELDS),
+    (albums_by_date, "albumsdate", ALBUM_FIELDS + ("date",)),
+    (albums_by_length, "albumslength", ALBUM_FIELDS + ("length",)),
+    (producers_by_name, "producers", ALBUM_FIELDS + ("producers",)),
+    (labels_by_name, "labels", ALBUM_FIELDS + ("labels",)),
+    (tags_by_name, "tags", ALBUM_FIELDS + ("tags",)),
+    (artists_by_name, "artists", ("artist_tag", "artist")),
+    (artists_by_rating, "artistsrating", ("artist_tag", "artist", "rating")),
+    (shopping_list, "shopping_list", ALBUM_FIELDS + ("date", "tags")),
+    (recent_albums, "recent_albums", ALBUM_FIELDS + ("date",)),
+)
@@ -0,0 +1,142 @@
+"""
+Query engine over the reviews database.
+Albums are indexed once: sorted indexes answer range filters by bisection and
+inverted indexes answer tags, producers and labels filters by set intersection.
+"""
+
+from bisect import bisect_left, bisect_right
+
+from .formatter.utils import alphanumeric_lowercase
+
+
+class QueryEngine:
+    """Indexes a list of albums to filter them by range of year, rating and review
+    date, and by tags, producers and labels.
+    """
+
+    def __init__(self, albums):
+        self.albums = list(albums)
+        # indexes are built on first use of their field
+        self.sorted_indexes = {}
+        self.inverted_indexes = {}
+
+    def sorted_index(self, field):
+        """Returns the sorted values of the field and the matching album positions."""
+        if field not in self.sorted_indexes:
+            self.sorted_indexes[field] = self.build_sorted_index(field)
+        return self.sorted_indexes[field]
+
+    def inverted_index(self, field):
+        """Returns a dict mapping each value of the field to album positions."""
+        if field not in self.inverted_indexes:
+            self.inverted_indexes[field] = self.build_inverted_index(field)
+        return self.inverted_indexes[field]
+
+    def build_sorted_index(self, field):
+        """Builds the sorted index of a field."""
+        positions = sorted(range(len(self.albums)), key=lambda i: self.albums[i][field])
+        values = [self.albums[i][field] for i in positions]
+        return values, positions
+
+    def build_inverted_index(self, field):
+        """Builds the inverted index of a multivalued field."""
+        index = {}
+        for i, album in enumerate(self.albums):
+            # optional fields -> may be None
+            if album[field] is not None:
+                for value in album[field]:
+                    index.setdefault(value, set()).add(i)
+        return index
+
+    def in_range(self, field, min_value=None, max_value=None):
+        """Returns the positions of albums with the field value between the given
+        bounds, which are both included.
+        """
+        values, positions = self.sorted_index(field)
+        start = 0 if min_value is None else bisect_left(values, min_value)
+        end = len(values) if max_value is None else bisect_right(values, max_value)
+        return set(positions[start:end])
+
+    def having(self, field, values):
+        """Returns the positions of albums with all the given values in the field."""
+        index = self.inverted_index(field)
+        # intersect starting with the rarest value
+        matches = sorted((index.get(value, set()) for value in values), key=len)
+        return set.intersection(*matches) if matches else set()
+
+    def values(self, field):
+        """Returns the sorted known values of a multivalued field."""
+        return sorted(self.inverted_index(field))
+
+    def query(
+        self,
+        min_year=None,
+        max_year=None,
+        min_rating=None,
+        max_rating=None,
+        since=None,
+        until=None,
+        tags=None,
+        producers=None,
+        labels=None,
+    ):
+        """Returns the albums matching all the given filters, in database order.
+        Bounds are included, and albums must have all the given tags, producers
+        and labels.
+        """
+        candidates = []
+        for field, min_value, max_value in (
+            ("year", min_year, max_year),
+            ("rating", min_rating, max_rating),
+            ("date", since, until),
+        ):
+            if min_value is not None or max_value is not None:
+                candidates.append(self.in_range(field, min_value, max_value))
+        for field, values in (
+            ("tags", tags),
+            ("producers", producers),
+            ("labels", labels),
+        ):
+            if values:
+                candidates.append(self.having(field, values))
+        if not candidates:
+            return list(self.albums)
+        positions = set.intersection(*sorted(candidates, key=len))
+        return [self.albums[i] for i in sorted(positions)]
+
+
+def name_key(name):
+    """Returns the key names are compared by, ignoring case, spacing and
+    punctuation. Names without any alphanumeric character are only case folded.
+    Names parsed as numbers by YAML, like an album named 1989, are compared as
+    strings.
+    """
+    name = str(name)
+    return alphanumeric_lowercase(name) or name.casefold().strip()
+
+
+class LibraryIndex:
+    """Indexes a list of albums by Spotify URI and by normalised artist and album
+    names, to find existing reviews with hash lookups.
+    """
+
+    def __init__(self, albums):
+        self.by_uri = {}
+        self.by_name = {}
+        for album in albums:
+            self.add(album)
+
+    def add(self, album):
+        """Adds an album to the index."""
+        # optional field -> may be None
+        if album["uri"]:
+            self.by_uri[album["uri"]] = album
+        self.by_name[(name_key(album["artist"]), name_key(album["album"]))] = album
+
+    def find(self, artist, album, uri=None):
+        """Returns the reviewed album with the given URI, or else with the same
+        normalised artist and album names, or None if there is none.
+        """
+        if uri and uri in self.by_uri:
+            return self.by_uri[uri]
+        return self.by_name.get((name_key(artist), name_key(album)))
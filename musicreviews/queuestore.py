@@ -0,0 +1,107 @@
+"""
+Store of the queue of albums to review, indexed by URI.
+The queue is persisted as an append-only log of JSON lines, each adding or removing
+an album, so that modifying the queue only appends a line to the file. The log is
+compacted once it holds more obsolete lines than albums.
+"""
+
+import json
+import os
+
+# logs are not compacted below this number of obsolete lines
+COMPACT_MIN_LINES = 100
+
+
+class QueueStore:
+    """Albums of the queue indexed by URI, in the order they were added.
+    Albums are dicts with at least an uri field.
+    A queue written by older versions as a JSON list is read, and converted to
+    a log on its first compaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.albums = {}
+        # number of lines of the log that don't hold a queued album
+        self.obsolete = 0
+        # whether the file has to be rewritten before appending to it
+        self.rewrite = False
+        self.load()
+
+    def __len__(self):
+        return len(self.albums)
+
+    def __iter__(self):
+        return iter(list(self.albums.values()))
+
+    def __contains__(self, uri):
+        return uri in self.albums
+
+    def get(self, uri):
+        """Returns the queued album of the URI, or None."""
+        return self.albums.get(uri)
+
+    def uris(self):
+        """Returns the set of URIs of the queued albums."""
+        return set(self.albums)
+
+    def add(self, album):
+        """Adds an album to the queue, replacing the album of the same URI."""
+        if album["uri"] in self.albums:
+            self.obsolete += 1
+        self.albums[album["uri"]] = album
+        self.append({"add": album})
+
+    def remove(self, uri):
+        """Removes the album of the URI from the queue, if it is queued."""
+        if self.albums.pop(uri, None) is None:
+            return
+        # both the line adding the album and the one removing it are obsolete
+        self.obsolete += 2
+        self.append({"remove": uri})
+
+    def load(self):
+        """Reads the queue from the log, or from a JSON list."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf8") as file_content:
+            content = file_content.read()
+        if content.lstrip().startswith("["):
+            self.albums = {album["uri"]: album for album in json.loads(content)}
+            self.rewrite = True
+            return
+        # the last line of a log whose writing was interrupted is dropped
+        self.rewrite = bool(content) and not content.endswith("\n")
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if "add" in entry:
+                if entry["add"]["uri"] in self.albums:
+                    self.obsolete += 1
+                self.albums[entry["add"]["uri"]] = entry["add"]
+            elif self.albums.pop(entry["remove"], None) is not None:
+                self.obsolete += 2
+            else:
+                self.obsolete += 1
+
+    def append(self, entry):
+        """Appends an entry to the log, compacting it if needed."""
+        if self.rewrite or self.obsolete > max(COMPACT_MIN_LINES, len(self.albums)):
+            self.compact()
+            return
+        with open(self.path, "a", encoding="utf8") as file_content:
+            file_content.write(json.dumps(entry) + "\n")
+
+    def compact(self):
+        """Rewrites the log with a line per queued album."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf8") as file_content:
+            for album in self.albums.values():
+                file_content.write(json.dumps({"add": album}) + "\n")
+        os.replace(temp_path, self.path)
+        self.obsolete = 0
+        self.rewrite = False
@@ -3,15 +3,51 @@ Helpers for reading files from disk, and building the database of reviews.
 """
 
 import glob
+import hashlib
 import os
+import pickle
+import re
+from collections.abc import Sequence
+from functools import lru_cache
+from itertools import repeat
 
-import frontmatter
+from . import timing
+from .configuration import config_directory
+
+# caches are kept in the configuration directory, never in the library where they
+# could be shared along with the reviews, as loading a pickle can run code
+CACHE_DIRECTORY = "library_cache"
+# bump when the cached album format changes in a way the signature can't see
+CACHE_VERSION = 1
+# below this number of reviews to parse, a process pool costs more than it saves
+PARALLEL_MIN_REVIEWS = 500
+# delimiter of the YAML header of reviews, as in frontmatter
+HEADER_DELIMITER = re.compile(r"^-{3,}\s*$")
 
 
 def read_file(root, filename):
     """Reads the file and returns its content as a string."""
-    with open(os.path.join(root, filename), encoding="utf8") as file_content:
+    path = os.path.join(root, filename)
+    with open(path, encoding="utf8") as file_content:
+        content = file_content.read()
+    timing.count_file("read", path)
+    return content
+
+
+def read_template(root, filename):
+    """Reads the template file and returns its content as a string.
+    Templates are only read once per process, unless the file is modified.
+    """
+    path = os.path.join(root, filename)
+    return read_template_version(path, os.stat(path).st_mtime_ns)
+
+
+@lru_cache(maxsize=None)
+def read_template_version(path, mtime):
+    """Reads the given version of a template file, caching it."""
+    with open(path, encoding="utf8") as file_content:
         content = file_content.read()
+    timing.count_file("read", path)
     return content
 
 
@@ -31,6 +67,7 @@ def empty_album():
         "tracks": None,
         "picks": None,
         "content": "",
+        "length": 0,
         "tags": None,
         "decade": 0,
         "date": "",
@@ -42,25 +79,307 @@ def compute_decade(year):
     return 10 * (year // 10)
 
 
-def build_album(artist_tag, file_path):
-    album = empty_album()
-    with open(file_path, "r", encoding="utf8") as f:
-        post = frontmatter.load(f)
-    album.update(post.to_dict())
+def read_header(file_path):
+    """Reads the YAML header of a review, stopping at its closing delimiter.
+    Returns the header metadata and the size of the header in bytes, or None if
+    the review has no header.
+    """
+    lines = []
+    size = 0
+    opened = False
+    with open(file_path, "rb") as f:
+        for line in f:
+            size += len(line)
+            line = line.decode("utf8")
+            if HEADER_DELIMITER.match(line):
+                if opened:
+                    from frontmatter.default_handlers import YAMLHandler
+
+                    return YAMLHandler().load("".join(lines)), size
+                opened = True
+            elif opened:
+                lines.append(line)
+            elif line.strip():
+                # text before the header
+                return None
+    return None
+
+
+class HeaderAlbum(dict):
+    """Album dict built from the header of a review only.
+    The review content is read from the file each time it is accessed, and never
+    stored in the album, so that cached albums stay without content.
+    """
+
+    def __init__(self, file_path, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file_path = file_path
+
+    def __missing__(self, key):
+        if key != "content":
+            raise KeyError(key)
+        return build_album(self["artist_tag"], self.file_path)["content"]
+
+
+def copy_album(album):
+    """Returns a modifiable dict copy of the album, with its content loaded.
+    The content is only loaded in the copy, the album is left untouched.
+    """
+    data = dict(album)
+    if "content" not in data:
+        data["content"] = album["content"]
+    return data
+
+
+class ReviewError(ValueError):
+    """Raised when a review can't be read or parsed, with the path of the review."""
+
+    def __init__(self, file_path, message):
+        super().__init__(file_path, message)
+        self.file_path = file_path
+        self.message = message
+
+    def __str__(self):
+        return f"{self.file_path}: {self.message}"
+
+
+def build_album(artist_tag, file_path, header_only=False):
+    """Builds the album of a review from its header and content.
+    With header_only, the content is only read when accessed, and the length of
+    the review is the size of the content in bytes instead of characters.
+    Raises ReviewError if the review can't be read or its header is invalid.
+    """
+    try:
+        return parse_album(artist_tag, file_path, header_only)
+    except Exception as error:
+        # the message is kept rather than the error, which may not be picklable
+        # across worker processes
+        raise ReviewError(file_path, str(error)) from error
+
+
+def parse_album(artist_tag, file_path, header_only=False):
+    """Builds the album of a review, see build_album."""
+    header = read_header(file_path) if header_only else None
+    if header is not None:
+        metadata, header_size = header
+        album = HeaderAlbum(file_path, empty_album())
+        del album["content"]
+        if isinstance(metadata, dict):
+            album.update(metadata)
+        album["length"] = os.path.getsize(file_path) - header_size
+    else:
+        # frontmatter and YAML are only imported when reviews are parsed, not when
+        # the library is loaded from the cache
+        import frontmatter
+
+        album = empty_album()
+        with open(file_path, "r", encoding="utf8") as f:
+            post = frontmatter.load(f)
+        album.update(post.to_dict())
+        album["length"] = len(album["content"])
     album["artist_tag"] = artist_tag
     album["album_tag"] = os.path.splitext(os.path.basename(file_path))[0]
     album["decade"] = compute_decade(album["year"])
     return album
 
 
-def build_database(root_dir=os.getcwd()):
-    """Finds reviews and builds a database using their header and content."""
-    albums = []
+def cache_signature(root_dir, header_only=False):
+    """Returns a signature of everything the cached albums depend on besides the
+    review files themselves: the cache version, the album schema, the template and
+    whether only headers are read.
+    """
+    signature = hashlib.sha1(f"{CACHE_VERSION} {header_only}".encode())
+    signature.update(repr(sorted(empty_album().items())).encode())
+    try:
+        with open(os.path.join(root_dir, "template.md"), "rb") as file_content:
+            signature.update(file_content.read())
+    except OSError:
+        pass
+    return signature.hexdigest()
+
+
+def file_key(file_path):
+    """Returns the key identifying a version of a review file in the cache."""
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def library_cache_path(root_dir, extension):
+    """Returns the path of a file caching the library in the configuration
+    directory, named after the location of the library.
+    """
+    name = hashlib.sha1(os.path.realpath(root_dir).encode()).hexdigest()
+    return os.path.join(config_directory(), CACHE_DIRECTORY, name + extension)
+
+
+def cache_path(root_dir):
+    """Returns the path of the cache of the library."""
+    return library_cache_path(root_dir, ".cache")
+
+
+def load_cache(root_dir, signature):
+    """Returns the cached albums of the library, indexed by review path.
+    Returns an empty cache if it is missing, unreadable or outdated.
+    """
+    try:
+        with open(cache_path(root_dir), "rb") as file_content:
+            cache = pickle.load(file_content)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("signature") != signature:
+        return {}
+    return cache["entries"]
+
+
+def write_cache(root_dir, signature, entries):
+    """Writes the cached albums of the library in the configuration directory."""
+    path = cache_path(root_dir)
+    temp_path = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, "wb") as file_content:
+            pickle.dump(
+                {"signature": signature, "entries": entries},
+                file_content,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(temp_path, path)
+    except OSError:
+        # the cache is an optimisation, a read-only library still loads
+        pass
+
+
+def find_reviews(root_dir):
+    """Returns the artist tag and path of each review in the library."""
+    reviews = []
     # find reviews in folders
     artist_tags = [
         f for f in os.listdir(root_dir) if os.path.isdir(os.path.join(root_dir, f))
     ]
     for artist_tag in artist_tags:
         for file_path in glob.glob(os.path.join(root_dir, artist_tag, "*.md")):
-            albums.append(build_album(artist_tag, file_path))
+            reviews.append((artist_tag, file_path))
+    return reviews
+
+
+def build_albums(reviews, workers=None, header_only=False):
+    """Parses the given reviews, a list of (artist_tag, file_path) tuples.
+    With several workers, reviews are parsed in chunks over a process pool. Albums
+    are returned in the order of the reviews either way.
+    """
+    # files are counted here as parsing may happen in other processes
+    timing.count("reviews parsed", len(reviews))
+    if timing.enabled:
+        for __, file_path in reviews:
+            timing.count_file("read", file_path)
+    with timing.phase("parse reviews"):
+        return parse_reviews(reviews, workers, header_only)
+
+
+def parse_reviews(reviews, workers=None, header_only=False):
+    """Parses the given reviews, over a process pool if there are enough of them."""
+    if workers is None or workers <= 1 or len(reviews) < PARALLEL_MIN_REVIEWS:
+        # starting the pool would cost more than it saves
+        return [
+            build_album(artist_tag, file_path, header_only)
+            for artist_tag, file_path in reviews
+        ]
+    # multiprocessing is slow to import and only needed for large libraries
+    from concurrent.futures import ProcessPoolExecutor
+
+    artist_tags, file_paths = zip(*reviews)
+    chunksize = max(1, len(reviews) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(
+                build_album,
+                artist_tags,
+                file_paths,
+                repeat(header_only),
+                chunksize=chunksize,
+            )
+        )
+
+
+def update_database(root_dir, entries, workers=None, header_only=False):
+    """Updates cache entries of the albums of the library, parsing only reviews
+    that are not in the entries or were modified.
+    Returns the albums, the updated entries and whether the entries changed.
+    """
+    reviews = find_reviews(root_dir)
+    keys = []
+    albums = []
+    stale_reviews = []
+    for artist_tag, file_path in reviews:
+        relative_path = os.path.relpath(file_path, root_dir)
+        key = file_key(file_path)
+        cached = entries.get(relative_path)
+        if cached is not None and cached[0] == key:
+            albums.append(cached[1])
+        else:
+            albums.append(None)
+            stale_reviews.append((artist_tag, file_path))
+        keys.append((relative_path, key))
+    # fill the gaps left by stale reviews, in order
+    parsed_albums = iter(build_albums(stale_reviews, workers, header_only))
+    albums = [next(parsed_albums) if album is None else album for album in albums]
+    # deleted reviews are dropped as only found reviews are kept in the entries
+    changed = bool(stale_reviews) or len(reviews) != len(entries)
+    if changed:
+        entries = {
+            relative_path: (key, album)
+            for (relative_path, key), album in zip(keys, albums)
+        }
+    return albums, entries, changed
+
+
+def build_database(
+    root_dir=os.getcwd(), use_cache=False, workers=None, header_only=False
+):
+    """Finds reviews and builds a database using their header and content.
+    With use_cache, only reviews added or modified since the last run are parsed,
+    the others are loaded from a cache stored in the configuration directory.
+    Parsing is spread over a number of worker processes if workers is set.
+    With header_only, reviews content is only read when accessed.
+    """
+    if not use_cache:
+        return build_albums(find_reviews(root_dir), workers, header_only)
+    signature = cache_signature(root_dir, header_only)
+    with timing.phase("load cache"):
+        entries = load_cache(root_dir, signature)
+    albums, entries, changed = update_database(root_dir, entries, workers, header_only)
+    if changed:
+        with timing.phase("write cache"):
+            write_cache(root_dir, signature, entries)
     return albums
+
+
+class LazyDatabase(Sequence):
+    """Sequence of albums that is only built the first time it is accessed.
+    The loader is any callable returning the list of albums, like build_database.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._albums = None
+
+    @property
+    def loaded(self):
+        """Returns whether the albums have already been built."""
+        return self._albums is not None
+
+    @property
+    def albums(self):
+        """Returns the list of albums, building it on first access."""
+        if self._albums is None:
+            self._albums = self.loader()
+        return self._albums
+
+    def __getitem__(self, index):
+        return self.albums[index]
+
+    def __iter__(self):
+        return iter(self.albums)
+
+    def __len__(self):
+        return len(self.albums)
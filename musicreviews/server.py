@@ -0,0 +1,188 @@
+"""
+Local HTTP server holding the reviews library in memory, and client helpers.
+The library is loaded once and reviews modified on disk are parsed again before
+answering requests, so that queries, indexes and exports skip loading the library.
+"""
+
+import datetime
+import json
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import Request, urlopen
+
+from . import exporter, indexer, reader
+from .querier import QueryEngine
+
+DEFAULT_PORT = 8765
+
+# album fields sent in query responses, reviews content is left out
+QUERY_FIELDS = (
+    "artist_tag",
+    "album_tag",
+    "artist",
+    "album",
+    "year",
+    "decade",
+    "rating",
+    "date",
+    "length",
+    "uri",
+    "tags",
+    "producers",
+    "labels",
+)
+
+
+def parse_date(string):
+    """Parses a YYYY-MM-DD string in a date."""
+    return datetime.datetime.strptime(string, "%Y-%m-%d").date()
+
+
+# query parameters with their converter, and whether they can be repeated
+QUERY_PARAMETERS = {
+    "min_year": (int, False),
+    "max_year": (int, False),
+    "min_rating": (int, False),
+    "max_rating": (int, False),
+    "since": (parse_date, False),
+    "until": (parse_date, False),
+    "tags": (str, True),
+    "producers": (str, True),
+    "labels": (str, True),
+}
+
+
+class LibraryServer(HTTPServer):
+    """HTTP server answering queries, index and export requests from the library
+    held in memory.
+    """
+
+    def __init__(
+        self,
+        address,
+        root_dir,
+        config,
+        workers=None,
+        use_cache=True,
+        header_only=False,
+    ):
+        super().__init__(address, RequestHandler)
+        self.root_dir = root_dir
+        self.config = config
+        self.workers = workers
+        self.header_only = header_only
+        self.entries = {}
+        if use_cache:
+            signature = reader.cache_signature(root_dir, header_only)
+            self.entries = reader.load_cache(root_dir, signature)
+        self.albums = []
+        self.engine = None
+        self.refresh()
+
+    def refresh(self):
+        """Parses the reviews added or modified since the last refresh."""
+        self.albums, self.entries, changed = reader.update_database(
+            self.root_dir, self.entries, self.workers, self.header_only
+        )
+        if changed or self.engine is None:
+            self.engine = QueryEngine(self.albums)
+
+    def query(self, parameters):
+        """Returns the albums matching the query parameters."""
+        filters = {}
+        for name, values in parameters.items():
+            converter, repeated = QUERY_PARAMETERS[name]
+            values = [converter(value) for value in values]
+            filters[name] = values if repeated else values[0]
+        matches = self.engine.query(**filters)
+        return [{field: album[field] for field in QUERY_FIELDS} for album in matches]
+
+    def index(self, force=False):
+        """Generates the markdown indexes and returns the written ones."""
+        return indexer.generate_all_indexes(
+            self.albums,
+            self.root_dir,
+            extension="md",
+            incremental=not force,
+            config=self.config,
+        )
+
+    def export(self, index=False, force=False):
+        """Exports indexes and, unless index is set, all reviews to HTML.
+        Returns the written indexes and the number of skipped reviews.
+        """
+        export_dir = self.config["path"]["export_directory"]
+        base_url = self.config["web"]["base_url"]
+        written = indexer.generate_all_indexes(
+            self.albums,
+            export_dir,
+            extension="html",
+            base_url=base_url,
+            incremental=not force,
+            config=self.config,
+        )
+        if index:
+            return {"indexes": written}
+        skipped = exporter.export_library(
+            self.albums,
+            self.root_dir,
+            export_dir,
+            base_url=base_url,
+            force=force,
+            workers=self.workers,
+        )
+        return {"indexes": written, "skipped": skipped}
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Handles JSON requests to the library server."""
+
+    def send_json(self, status, data):
+        """Sends the data as a JSON response."""
+        body = json.dumps(data, default=str).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/query":
+            self.send_json(404, {"error": f"unknown path {url.path}"})
+            return
+        self.server.refresh()
+        try:
+            albums = self.server.query(parse_qs(url.query))
+        except (KeyError, ValueError) as error:
+            self.send_json(400, {"error": f"invalid query: {error}"})
+            return
+        self.send_json(200, {"albums": albums})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parameters = parse_qs(url.query, keep_blank_values=True)
+        force = "force" in parameters
+        if url.path not in ("/index", "/export"):
+            self.send_json(404, {"error": f"unknown path {url.path}"})
+            return
+        self.server.refresh()
+        try:
+            if url.path == "/index":
+                response = {"indexes": self.server.index(force=force)}
+            else:
+                index = "index" in parameters
+                response = self.server.export(index=index, force=force)
+        except OSError as error:
+            self.send_json(500, {"error": str(error)})
+            return
+        self.send_json(200, response)
+
+
+def request(url, path, parameters=None, method="GET"):
+    """Sends a request to a library server and returns the decoded response."""
+    full_url = url.rstrip("/") + path
+    if parameters:
+        full_url += "?" + urlencode(parameters, doseq=True)
+    with urlopen(Request(full_url, method=method)) as response:
+        return json.loads(response.read().decode("utf8"))
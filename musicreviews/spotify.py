@@ -0,0 +1,192 @@
+"""
+Access to Spotify albums and artists through a local cache of responses.
+Albums missing from the cache are requested in batches over a pool of threads.
+The backend sending the requests can be swapped, for instance for a local fake.
+"""
+
+import os
+import pickle
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from powerspot.operations import get_artist, operation
+
+from .configuration import config_directory
+
+CACHE_FILENAME = "spotify.cache"
+# maximum number of albums per request allowed by the Spotify API
+ALBUMS_BATCH_SIZE = 20
+DEFAULT_CACHE_DAYS = 30
+DEFAULT_TTL = DEFAULT_CACHE_DAYS * 24 * 3600
+DEFAULT_SIZE = 5000
+DEFAULT_WORKERS = 4
+
+
+@operation
+def get_albums(sp, album_ids):
+    """Returns albums given their IDs or URIs, 20 at most."""
+    return sp.albums(album_ids)["albums"]
+
+
+class PowerspotBackend:
+    """Backend requesting the Spotify API through powerspot."""
+
+    def albums(self, uris):
+        """Returns the albums of the URIs, None for unknown ones."""
+        return get_albums(uris)
+
+    def artist(self, uri):
+        """Returns the artist of the URI."""
+        return get_artist(uri)
+
+
+class FakeBackend:
+    """Backend answering from a dict of responses indexed by URI, without network.
+    Counts the requests it receives.
+    """
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.requests = 0
+
+    def albums(self, uris):
+        """Returns the albums of the URIs, None for unknown ones."""
+        self.requests += 1
+        return [self.responses.get(uri) for uri in uris]
+
+    def artist(self, uri):
+        """Returns the artist of the URI."""
+        self.requests += 1
+        return self.responses[uri]
+
+
+class ResponseCache:
+    """Cache of responses indexed by key, persisted in a file if a path is given.
+    Responses expire after ttl seconds, and the least recently used ones are
+    evicted beyond size responses.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, size=DEFAULT_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.size = size
+        # key -> (time of the response, response), least recently used first
+        self.entries = OrderedDict()
+        self.changed = False
+        if path is not None:
+            self.load()
+
+    def get(self, key):
+        """Returns the cached response of the key, or None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > self.ttl:
+            del self.entries[key]
+            self.changed = True
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, response):
+        """Caches the response of the key, evicting responses beyond the size."""
+        self.entries[key] = (time.time(), response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        self.changed = True
+
+    def load(self):
+        """Loads the responses cached in the file, if it is readable."""
+        try:
+            with open(self.path, "rb") as file_content:
+                entries = pickle.load(file_content)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            return
+        if isinstance(entries, OrderedDict):
+            self.entries = entries
+
+    def save(self):
+        """Writes the cached responses in the file if they changed."""
+        if self.path is None or not self.changed:
+            return
+        temp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, "wb") as file_content:
+                pickle.dump(
+                    self.entries, file_content, protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(temp_path, self.path)
+        except OSError:
+            # the cache is an optimisation, lookups still work without it
+            return
+        self.changed = False
+
+
+class SpotifyClient:
+    """Lookups of albums and artists answered from the cache when possible.
+    Missing albums are requested to the backend in batches, over a pool of
+    workers threads.
+    """
+
+    def __init__(self, backend=None, cache=None, workers=DEFAULT_WORKERS):
+        self.backend = backend if backend is not None else PowerspotBackend()
+        self.cache = cache if cache is not None else ResponseCache()
+        self.workers = workers
+
+    def albums(self, uris):
+        """Returns a dict of the albums of the URIs, in the same order.
+        Unknown albums are left out.
+        """
+        albums = {}
+        missing = []
+        for uri in uris:
+            album = self.cache.get(("album", uri))
+            if album is None:
+                missing.append(uri)
+            else:
+                albums[uri] = album
+        batches = [
+            missing[i : i + ALBUMS_BATCH_SIZE]
+            for i in range(0, len(missing), ALBUMS_BATCH_SIZE)
+        ]
+        if self.workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(min(self.workers, len(batches))) as executor:
+                responses = list(executor.map(self.backend.albums, batches))
+        else:
+            responses = [self.backend.albums(batch) for batch in batches]
+        # responses are cached from this thread only
+        for batch, response in zip(batches, responses):
+            for uri, album in zip(batch, response):
+                if album is not None:
+                    self.cache.set(("album", uri), album)
+                    albums[uri] = album
+        return {uri: albums[uri] for uri in uris if uri in albums}
+
+    def album(self, uri):
+        """Returns the album of the URI, or None if it is unknown."""
+        return self.albums([uri]).get(uri)
+
+    def artist(self, uri):
+        """Returns the artist of the URI."""
+        artist = self.cache.get(("artist", uri))
+        if artist is None:
+            artist = self.backend.artist(uri)
+            self.cache.set(("artist", uri), artist)
+        return artist
+
+
+def load_client(config, backend=None):
+    """Returns a client caching responses in the configuration directory, with
+    the cache settings of the spotify section of the configuration.
+    """
+    days = config.getint("spotify", "cache_days", fallback=DEFAULT_CACHE_DAYS)
+    cache = ResponseCache(
+        os.path.join(config_directory(), CACHE_FILENAME),
+        ttl=days * 24 * 3600,
+        size=config.getint("spotify", "cache_size", fallback=DEFAULT_SIZE),
+    )
+    workers = config.getint("spotify", "workers", fallback=DEFAULT_WORKERS)
+    return SpotifyClient(backend, cache, workers)
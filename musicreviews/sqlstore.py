@@ -0,0 +1,351 @@
+"""
+SQLite storage of the reviews database.
+Albums are stored in a database in the configuration directory, next to the
+albums cache, with their tracks, picks, tags, producers and labels in separate
+tables. Syncing only parses the reviews added or modified since the last sync,
+and the database can be rebuilt from the reviews, which stay the source of
+truth, at any time.
+Loaded albums are dicts like the ones of build_database, their content is only
+read from the database when accessed.
+"""
+
+import os
+import sqlite3
+from datetime import date
+from functools import lru_cache
+
+from . import timing
+from .reader import (
+    build_albums,
+    cache_signature,
+    empty_album,
+    file_key,
+    find_reviews,
+    library_cache_path,
+)
+
+DATABASE_EXTENSION = ".sqlite"
+# bump when the schema changes, the database is then rebuilt
+SCHEMA_VERSION = 1
+# header values are stored in untyped columns to keep their YAML types
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS albums (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    artist_tag TEXT NOT NULL,
+    album_tag TEXT NOT NULL,
+    artist,
+    album,
+    year,
+    rating,
+    uri,
+    cover,
+    content TEXT,
+    length INTEGER,
+    decade INTEGER,
+    date
+);
+CREATE INDEX IF NOT EXISTS albums_year ON albums (year);
+CREATE INDEX IF NOT EXISTS albums_rating ON albums (rating);
+CREATE INDEX IF NOT EXISTS albums_date ON albums (date);
+CREATE INDEX IF NOT EXISTS albums_artist ON albums (artist_tag, album_tag);
+CREATE TABLE IF NOT EXISTS tracks (
+    album_id INTEGER NOT NULL REFERENCES albums (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    number,
+    name
+);
+CREATE INDEX IF NOT EXISTS tracks_album ON tracks (album_id);
+"""
+# multivalued fields stored in their own table, with the column of their values
+LIST_TABLES = (
+    ("picks", "pick"),
+    ("tags", "tag"),
+    ("producers", "producer"),
+    ("labels", "label"),
+)
+SCHEMA += "".join(
+    f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    album_id INTEGER NOT NULL REFERENCES albums (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    {column}
+);
+CREATE INDEX IF NOT EXISTS {table}_album ON {table} (album_id);
+CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column}, album_id);
+"""
+    for table, column in LIST_TABLES
+)
+# album fields stored in the albums table, content excepted
+ALBUM_COLUMNS = (
+    "artist_tag",
+    "album_tag",
+    "artist",
+    "album",
+    "year",
+    "rating",
+    "uri",
+    "cover",
+    "length",
+    "decade",
+    "date",
+)
+
+
+def database_path(root_dir):
+    """Returns the path of the database of the library."""
+    return library_cache_path(root_dir, DATABASE_EXTENSION)
+
+
+def open_database(root_dir, rebuild=False):
+    """Opens the database of the library, creating it if needed.
+    Its albums are removed if rebuild is set or if they are outdated, so that the
+    next sync parses all reviews again.
+    """
+    path = database_path(root_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    with connection:
+        connection.executescript(SCHEMA)
+        signature = f"{SCHEMA_VERSION} {cache_signature(root_dir)}"
+        row = connection.execute(
+            "SELECT value FROM meta WHERE key = 'signature'"
+        ).fetchone()
+        if rebuild or row is None or row[0] != signature:
+            connection.execute("DELETE FROM albums")
+            connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)",
+                (signature,),
+            )
+    return connection
+
+
+def to_sql(value):
+    """Returns the value stored for a header value: dates are stored as ISO
+    strings, which keep their order.
+    """
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def from_sql_date(value):
+    """Returns the date stored as an ISO string, other values are kept."""
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+    return value
+
+
+def list_values(values):
+    """Returns the values of a multivalued field as a list."""
+    # optional fields -> may be None or empty strings
+    if not values:
+        return []
+    if isinstance(values, str):
+        return [values]
+    return list(values)
+
+
+def insert_album(connection, relative_path, key, album):
+    """Inserts the album of a review and its multivalued fields."""
+    cursor = connection.execute(
+        f"INSERT INTO albums (path, mtime_ns, size, content, "
+        f"{', '.join(ALBUM_COLUMNS)}) "
+        f"VALUES (?, ?, ?, ?, {', '.join('?' * len(ALBUM_COLUMNS))})",
+        (relative_path, key[0], key[1], album["content"])
+        + tuple(to_sql(album[column]) for column in ALBUM_COLUMNS),
+    )
+    album_id = cursor.lastrowid
+    tracks = album["tracks"]
+    if isinstance(tracks, dict):
+        tracks = tracks.items()
+    else:
+        tracks = enumerate(list_values(tracks), 1)
+    connection.executemany(
+        "INSERT INTO tracks (album_id, position, number, name) VALUES (?, ?, ?, ?)",
+        [(album_id, i, number, name) for i, (number, name) in enumerate(tracks)],
+    )
+    for table, column in LIST_TABLES:
+        connection.executemany(
+            f"INSERT INTO {table} (album_id, position, {column}) VALUES (?, ?, ?)",
+            [
+                (album_id, i, value)
+                for i, value in enumerate(list_values(album[table]))
+            ],
+        )
+
+
+def sync(connection, root_dir, workers=None):
+    """Updates the database with the reviews of the library, parsing only reviews
+    added or modified since the last sync, and removing deleted ones.
+    Returns the number of parsed and removed reviews.
+    """
+    stored = {
+        path: (album_id, (mtime_ns, size))
+        for album_id, path, mtime_ns, size in connection.execute(
+            "SELECT id, path, mtime_ns, size FROM albums"
+        )
+    }
+    stale_reviews = []
+    keys = []
+    found = set()
+    for artist_tag, file_path in find_reviews(root_dir):
+        relative_path = os.path.relpath(file_path, root_dir)
+        key = file_key(file_path)
+        found.add(relative_path)
+        if relative_path not in stored or stored[relative_path][1] != key:
+            stale_reviews.append((artist_tag, file_path))
+            keys.append((relative_path, key))
+    stale_paths = set(relative_path for relative_path, __ in keys)
+    # modified reviews are removed and inserted again
+    removed = [
+        (album_id,)
+        for path, (album_id, __) in stored.items()
+        if path not in found or path in stale_paths
+    ]
+    albums = build_albums(stale_reviews, workers)
+    with timing.phase("write database"), connection:
+        # tracks, picks, tags, producers and labels are removed by cascade
+        connection.executemany("DELETE FROM albums WHERE id = ?", removed)
+        for (relative_path, key), album in zip(keys, albums):
+            insert_album(connection, relative_path, key, album)
+    return len(stale_reviews), len(stored.keys() - found)
+
+
+class SqlAlbum(dict):
+    """Album dict loaded from the database without its content.
+    The content is read from the database the first time it is accessed.
+    """
+
+    def __init__(self, path, album_id, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self.album_id = album_id
+
+    def __missing__(self, key):
+        if key != "content":
+            raise KeyError(key)
+        (self["content"],) = (
+            content_connection(self.path)
+            .execute("SELECT content FROM albums WHERE id = ?", (self.album_id,))
+            .fetchone()
+        )
+        return self["content"]
+
+
+@lru_cache(maxsize=None)
+def content_connection(path):
+    """Returns a connection reading the content of albums, shared in the process."""
+    return sqlite3.connect(path)
+
+
+def load_albums(connection, where="1", parameters=()):
+    """Loads the albums matching the SQL condition, sorted by artist and album.
+    Their content is only read when accessed.
+    """
+    path = connection.execute("PRAGMA database_list").fetchone()[2]
+    selection = f"SELECT id FROM albums WHERE {where}"
+    albums = {}
+    for row in connection.execute(
+        f"SELECT id, {', '.join(ALBUM_COLUMNS)} FROM albums WHERE {where} "
+        "ORDER BY artist_tag, album_tag",
+        parameters,
+    ):
+        album = SqlAlbum(path, row[0], empty_album())
+        del album["content"]
+        album.update(zip(ALBUM_COLUMNS, row[1:]))
+        album["date"] = from_sql_date(album["date"])
+        albums[row[0]] = album
+    for album_id, number, name in connection.execute(
+        f"SELECT album_id, number, name FROM tracks WHERE album_id IN ({selection}) "
+        "ORDER BY album_id, position",
+        parameters,
+    ):
+        if albums[album_id]["tracks"] is None:
+            albums[album_id]["tracks"] = {}
+        albums[album_id]["tracks"][number] = name
+    for table, column in LIST_TABLES:
+        for album_id, value in connection.execute(
+            f"SELECT album_id, {column} FROM {table} "
+            f"WHERE album_id IN ({selection}) ORDER BY album_id, position",
+            parameters,
+        ):
+            # fields without values keep their default value
+            if not albums[album_id][table]:
+                albums[album_id][table] = []
+            albums[album_id][table].append(value)
+    return list(albums.values())
+
+
+class SqlQueryEngine:
+    """Filters the albums of the database like QueryEngine, with SQL queries using
+    the indexes of the database.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def query(
+        self,
+        min_year=None,
+        max_year=None,
+        min_rating=None,
+        max_rating=None,
+        since=None,
+        until=None,
+        tags=None,
+        producers=None,
+        labels=None,
+    ):
+        """Returns the albums matching all the given filters, sorted by artist and
+        album. Bounds are included, and albums must have all the given tags,
+        producers and labels.
+        """
+        conditions = []
+        parameters = []
+        for column, min_value, max_value in (
+            ("year", min_year, max_year),
+            ("rating", min_rating, max_rating),
+            ("date", since, until),
+        ):
+            if min_value is not None:
+                conditions.append(f"{column} >= ?")
+                parameters.append(to_sql(min_value))
+            if max_value is not None:
+                conditions.append(f"{column} <= ?")
+                parameters.append(to_sql(max_value))
+        for table, column, values in (
+            ("tags", "tag", tags),
+            ("producers", "producer", producers),
+            ("labels", "label", labels),
+        ):
+            for value in values or ():
+                conditions.append(
+                    f"id IN (SELECT album_id FROM {table} WHERE {column} = ?)"
+                )
+                parameters.append(value)
+        return load_albums(
+            self.connection, " AND ".join(conditions) or "1", tuple(parameters)
+        )
+
+
+def build_database(root_dir=os.getcwd(), workers=None, rebuild=False):
+    """Syncs the database of the library and loads its albums.
+    Parsing is spread over a number of worker processes if workers is set.
+    """
+    connection = open_database(root_dir, rebuild)
+    try:
+        with timing.phase("sync database"):
+            sync(connection, root_dir, workers)
+        with timing.phase("load database"):
+            return load_albums(connection)
+    finally:
+        connection.close()
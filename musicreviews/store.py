@@ -0,0 +1,141 @@
+"""
+Compact columnar storage of the reviews database.
+Numeric fields are stored in arrays, strings are interned and shared between
+albums, and reviews content is only read from disk when accessed.
+Each album is available as a read-only dict-like view for indexers and formatters.
+"""
+
+import os
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+from .reader import empty_album
+
+FIELDS = tuple(empty_album())
+# fields stored in integer arrays
+NUMERIC_FIELDS = ("year", "rating", "decade", "length")
+# fields holding several values, stored as tuples of interned strings
+MULTIVALUED_FIELDS = ("tags", "producers", "labels")
+# fields stored as they are, with interned strings
+OBJECT_FIELDS = tuple(
+    field
+    for field in FIELDS
+    if field not in NUMERIC_FIELDS + MULTIVALUED_FIELDS + ("content",)
+)
+# keys of album views: the content is read from disk, so it is left out of the
+# keys like in header-only albums, and only read when accessed explicitly
+VIEW_FIELDS = tuple(field for field in FIELDS if field != "content")
+
+
+def intern_value(value):
+    """Returns the interned version of strings, other values are kept."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def intern_values(values):
+    """Returns a tuple of interned values, or None if values is None."""
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return intern_value(values)
+    return tuple(intern_value(value) for value in values)
+
+
+def read_content(file_path):
+    """Reads the content of a review, without its header."""
+    import frontmatter
+
+    with open(file_path, "r", encoding="utf8") as f:
+        return frontmatter.load(f).content
+
+
+class AlbumStore(Sequence):
+    """Stores albums by column. Items are AlbumView objects."""
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.numeric_columns = {field: array("i") for field in NUMERIC_FIELDS}
+        self.columns = {field: [] for field in OBJECT_FIELDS + MULTIVALUED_FIELDS}
+
+    @classmethod
+    def from_albums(cls, albums, root_dir):
+        """Builds a store from album dicts, dropping their content."""
+        store = cls(root_dir)
+        for album in albums:
+            store.append(album)
+        return store
+
+    def append(self, album):
+        """Adds an album dict to the store, without its content."""
+        for field in NUMERIC_FIELDS:
+            try:
+                self.numeric_columns[field].append(album[field])
+            except TypeError:
+                # not an integer, the column falls back to a list
+                self.numeric_columns[field] = list(self.numeric_columns[field])
+                self.numeric_columns[field].append(album[field])
+        for field in OBJECT_FIELDS:
+            self.columns[field].append(intern_value(album[field]))
+        for field in MULTIVALUED_FIELDS:
+            self.columns[field].append(intern_values(album[field]))
+
+    def value(self, index, field):
+        """Returns the value of a field for the album at the given index."""
+        if field in self.numeric_columns:
+            return self.numeric_columns[field][index]
+        if field == "content":
+            return self.content(index)
+        return self.columns[field][index]
+
+    def content(self, index):
+        """Reads the content of the review at the given index from disk."""
+        return read_content(
+            os.path.join(
+                self.root_dir,
+                self.columns["artist_tag"][index],
+                self.columns["album_tag"][index] + ".md",
+            )
+        )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [AlbumView(self, i) for i in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("album index out of range")
+        return AlbumView(self, index)
+
+    def __len__(self):
+        return len(self.numeric_columns["year"])
+
+
+class AlbumView(Mapping):
+    """Read-only dict-like view of an album in a store.
+    The content is not one of its keys but can be accessed with view["content"].
+    Use reader.copy_album(view) to get a modifiable copy, with the content loaded.
+    """
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, field):
+        return self.store.value(self.index, field)
+
+    def __iter__(self):
+        return iter(VIEW_FIELDS)
+
+    def __len__(self):
+        return len(VIEW_FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, AlbumView):
+            return self.store is other.store and self.index == other.index
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
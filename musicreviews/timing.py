@@ -0,0 +1,92 @@
+"""
+Instrumentation of commands: wall time spent in each phase, and counters of the
+files read and written. Disabled by default, phases then cost a single check.
+Only the main process is instrumented, work done in worker processes is not counted.
+"""
+
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+enabled = False
+# phase name -> [total seconds, number of calls]
+phases = defaultdict(lambda: [0.0, 0])
+# counter name -> value
+counters = defaultdict(int)
+# completed phases as (name, start, duration) for traces
+events = []
+start_time = time.perf_counter()
+
+
+def enable():
+    """Starts recording phases and counters, discarding previous records."""
+    global enabled, start_time
+    enabled = True
+    phases.clear()
+    counters.clear()
+    del events[:]
+    start_time = time.perf_counter()
+
+
+@contextmanager
+def phase(name):
+    """Records the wall time spent in the enclosed block under the phase name."""
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        phases[name][0] += duration
+        phases[name][1] += 1
+        events.append((name, start - start_time, duration))
+
+
+def count(name, value=1):
+    """Adds the value to a counter."""
+    if enabled:
+        counters[name] += value
+
+
+def count_file(operation, path):
+    """Counts a file read or written and its size in bytes."""
+    if enabled:
+        counters[f"files {operation}"] += 1
+        counters[f"bytes {operation}"] += os.path.getsize(path)
+
+
+def summary():
+    """Returns the summary table of phases and counters as a string."""
+    lines = [f"{'phase':40} {'seconds':>10} {'calls':>8}"]
+    for name, (seconds, calls) in sorted(phases.items(), key=lambda x: -x[1][0]):
+        lines.append(f"{name:40} {seconds:10.4f} {calls:8d}")
+    lines.append(f"{'total':40} {time.perf_counter() - start_time:10.4f}")
+    if counters:
+        lines.append("")
+        for name, value in sorted(counters.items()):
+            lines.append(f"{name:40} {value:10d}")
+    return "\n".join(lines)
+
+
+def write_trace(path):
+    """Writes recorded phases as a JSON trace, viewable in chrome://tracing."""
+    trace = {
+        "traceEvents": [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": duration * 1e6,
+                "pid": os.getpid(),
+                "tid": 0,
+            }
+            for name, start, duration in events
+        ],
+        "otherData": dict(counters),
+    }
+    with open(path, "w") as f:
+        json.dump(trace, f)
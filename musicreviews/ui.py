@@ -3,6 +3,7 @@ Helpers for CLI UI and specific prompts.
 """
 
 import re
+from bisect import bisect_left
 
 import click
 
@@ -97,20 +98,75 @@ def list_strings_input(string):
     return strings
 
 
+class CompletionIndex:
+    """Sorted and deduplicated values, returning the values starting with a prefix
+    in O(log N + k) with a binary search.
+    With ignore_case, prefixes match regardless of case. With fuzzy, values
+    containing the letters of the text in order are returned if none starts
+    with it.
+    Values are completed as strings, like YAML numbers such as an artist named 311.
+    """
+
+    def __init__(self, values, ignore_case=False, fuzzy=False):
+        self.ignore_case = ignore_case
+        self.fuzzy = fuzzy
+        values = set(str(value) for value in values)
+        entries = sorted((self.key(value), value) for value in values)
+        self.keys = [key for key, __ in entries]
+        self.values = [value for __, value in entries]
+        self.known = set(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self.known
+
+    def key(self, value):
+        """Returns the string values are sorted and matched by."""
+        return value.casefold() if self.ignore_case else value
+
+    def matches(self, text):
+        """Returns the values starting with the text, in order."""
+        prefix = self.key(text)
+        start = bisect_left(self.keys, prefix)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(prefix):
+            end += 1
+        if start == end and self.fuzzy:
+            return [
+                value
+                for key, value in zip(self.keys, self.values)
+                if is_subsequence(prefix, key)
+            ]
+        return self.values[start:end]
+
+
+def is_subsequence(text, string):
+    """Returns whether the characters of the text appear in order in the string."""
+    characters = iter(string)
+    return all(character in characters for character in text)
+
+
 def completion_input(prompt_text, commands, **kwargs):
-    """Returns a click prompt with tab-completion on the given list of commands."""
+    """Returns a click prompt with tab-completion on the given list of commands.
+    Commands can be given as a completion index, which is built otherwise.
+    """
+    if not isinstance(commands, CompletionIndex):
+        commands = CompletionIndex(commands)
+    # matches are only searched once for all the states readline asks for
+    matches = []
 
     def complete(text, state):
         """Completion function for readline."""
-        for cmd in commands:
-            if cmd.startswith(text):
-                if not state:
-                    return cmd
-                else:
-                    state -= 1
+        if state == 0:
+            matches[:] = commands.matches(text)
+        return matches[state] if state < len(matches) else None
 
     if readline_available:
         readline.parse_and_bind("tab: complete")
+        # commands are completed as a whole, spaces included
+        readline.set_completer_delims("")
         readline.set_completer(complete)
         # tab completion on commands will stay enabled outside this scope
     return click.prompt(prompt_text, **kwargs)
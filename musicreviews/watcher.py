@@ -0,0 +1,120 @@
+"""
+Helpers for watching the reviews library for modified reviews.
+Uses inotify if inotify_simple is installed, else polls the reviews files.
+"""
+
+import os
+import time
+
+from .reader import file_key, find_reviews
+
+try:
+    from inotify_simple import INotify, flags
+
+    inotify_available = True
+except ImportError:
+    inotify_available = False
+
+
+def snapshot(root_dir):
+    """Returns the modification time and size of each review in the library."""
+    return {file_path: file_key(file_path) for __, file_path in find_reviews(root_dir)}
+
+
+class PollingWatcher:
+    """Detects modified reviews by comparing snapshots of the library."""
+
+    def __init__(self, root_dir, interval=1.0):
+        self.root_dir = root_dir
+        self.interval = interval
+        self.state = snapshot(root_dir)
+
+    def wait(self, timeout=None):
+        """Waits for modified reviews for at most timeout seconds, forever if None.
+        Returns whether reviews were modified.
+        """
+        start = time.monotonic()
+        while True:
+            time.sleep(
+                self.interval if timeout is None else min(self.interval, timeout)
+            )
+            try:
+                state = snapshot(self.root_dir)
+            except OSError:
+                # a review was deleted while listing the library
+                continue
+            if state != self.state:
+                self.state = state
+                return True
+            if timeout is not None and time.monotonic() - start >= timeout:
+                return False
+
+
+class InotifyWatcher:
+    """Detects modified reviews with inotify events on the artist folders."""
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.inotify = INotify()
+        self.mask = (
+            flags.CREATE
+            | flags.DELETE
+            | flags.CLOSE_WRITE
+            | flags.MOVED_FROM
+            | flags.MOVED_TO
+        )
+        self.root_descriptor = self.inotify.add_watch(root_dir, self.mask)
+        self.watched = set()
+        self.add_artist_watches()
+
+    def add_artist_watches(self):
+        """Watches artist folders that are not watched yet."""
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if name not in self.watched and os.path.isdir(path):
+                self.inotify.add_watch(path, self.mask)
+                self.watched.add(name)
+
+    def wait(self, timeout=None):
+        """Waits for modified reviews for at most timeout seconds, forever if None.
+        Returns whether reviews were modified.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.monotonic())
+            events = self.inotify.read(
+                timeout=None if remaining is None else int(remaining * 1000)
+            )
+            if not events and deadline is not None:
+                return False
+            modified = False
+            for event in events:
+                if event.wd == self.root_descriptor:
+                    # artist folders created, deleted or moved hold reviews,
+                    # indexes written in the root are ignored
+                    if event.mask & flags.ISDIR:
+                        self.watched.discard(event.name)
+                        self.add_artist_watches()
+                        modified = True
+                elif event.name.endswith(".md"):
+                    modified = True
+            if modified:
+                return True
+
+
+def watch(root_dir, callback, debounce=1.0, polling=False, interval=1.0):
+    """Calls the callback each time reviews are modified in the library.
+    Bursts of modifications trigger a single call, once no review has been
+    modified for debounce seconds.
+    """
+    if inotify_available and not polling:
+        watcher = InotifyWatcher(root_dir)
+    else:
+        watcher = PollingWatcher(root_dir, interval)
+    while True:
+        watcher.wait()
+        while watcher.wait(debounce):
+            pass
+        callback()
@@ -4,14 +4,21 @@ to different formats.
 """
 
 import datetime
+import hashlib
 import os
 
 import click
 
+from . import timing
 from .formatter import html, utils
-from .reader import read_file
+from .reader import read_template
 from .ui import style_error
 
+# suffix of the temporary files written before replacing files
+TEMP_SUFFIX = ".tmp"
+# number of files staged by a write transaction before they are moved into place
+BATCH_SIZE = 64
+
 
 def fill_review_template(
     template,
@@ -69,11 +76,31 @@ def fill_review_template(
     )
 
 
-def export_review(data, root, base_url=None):
-    """Exports review(s) to HTML. Formats metadata and content."""
-    template = read_file(root, "template.html")
-    data["content"] = utils.replace_track_tags(data["content"]).format(**data)
-    data["content"] = html.markdown_to_html(data["content"])
+def export_review(data, root, base_url=None, template=None, transaction=None):
+    """Exports review(s) to HTML. Formats metadata and content.
+    The template is read from the root directory if not given.
+    The file is written through the write transaction if given.
+    """
+    if template is None:
+        template = read_template(root, "template.html")
+    with timing.phase("export render review"):
+        formatted_review = render_review(data, template, base_url)
+    with timing.phase("export write review"):
+        write_review(
+            content=formatted_review,
+            folder=data["artist_tag"],
+            filename=data["album_tag"],
+            root=root,
+            extension="html",
+            overwrite=True,
+            transaction=transaction,
+        )
+
+
+def render_review(data, template, base_url=None):
+    """Formats the metadata and content of a review and fills the HTML template."""
+    # track references and fields are filled while converting the content
+    data["content"] = html.markdown_to_html(data["content"], data)
     data["tracks"] = html.format_tracks_picks(data["tracks"], data["picks"])
     if data["tags"] is None:
         # tags are optional -> may be None
@@ -85,31 +112,173 @@ def export_review(data, root, base_url=None):
     data["rating_color"] = html.rating_to_rbg_color(data["rating"])
     if base_url is not None:
         data["base_url"] = base_url
-    formatted_review = template.format(**data)
-    write_review(
-        content=formatted_review,
-        folder=data["artist_tag"],
-        filename=data["album_tag"],
-        root=root,
-        extension="html",
-        overwrite=True,
-    )
+    return template.format(**data)
+
+
+def export_artist_index(albums, root, base_url=None, template=None, transaction=None):
+    """Exports the index of the reviews of an artist to HTML.
+    The template is read from the root directory if not given.
+    The file is written through the write transaction if given.
+    """
+    if template is None:
+        template = read_template(root, "template_index.html")
+    sorted_albums = sorted(albums, key=lambda x: (x["year"], x["rating"]), reverse=True)
+    content = html.iter_list(sorted_albums, html.format_album)
+    title = sorted_albums[0]["artist"]
+    folder = os.path.join(root, sorted_albums[0]["artist_tag"])
+    os.makedirs(folder, exist_ok=True)
+    content = utils.iter_template(template, content, title=title, base_url=base_url)
+    path = os.path.join(folder, "index.html")
+    if transaction is not None:
+        transaction.write(content, path)
+    else:
+        write_chunks(content, path)
 
 
 def write_file(content, path, newline=False):
-    """Writes the given content in a file, with an optional newline at the end."""
-    with open(path, "w", encoding="utf8") as file_content:
+    """Writes the given content in a file, with an optional newline at the end.
+    Content is written in a temporary file moved into place, so that the file is
+    never left half-written.
+    """
+    temp_path = path + TEMP_SUFFIX
+    with open(temp_path, "w", encoding="utf8") as file_content:
         file_content.write(content)
         if newline:
             file_content.write("\n")
+    os.replace(temp_path, path)
+    timing.count_file("written", path)
+
+
+def write_chunks(chunks, path):
+    """Writes the chunks of content yielded by an iterator in a file as they come.
+    As with write_file, the file is replaced once all chunks are written.
+    """
+    temp_path = path + TEMP_SUFFIX
+    with open(temp_path, "w", encoding="utf8") as file_content:
+        file_content.writelines(chunks)
+    os.replace(temp_path, path)
+    timing.count_file("written", path)
+
+
+def file_digest(path):
+    """Returns the SHA-1 hex digest of the file content, or None if it is missing."""
+    digest = hashlib.sha1()
+    try:
+        with open(path, "rb") as file_content:
+            for block in iter(lambda: file_content.read(1 << 16), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def sync_directory(path):
+    """Flushes the entries of a directory to disk, where the platform allows it."""
+    try:
+        descriptor = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
+class WriteTransaction:
+    """Writes files atomically and in batches.
+    Each file is staged in a temporary file next to it. Staged files are synced to
+    disk and renamed into place by batches, when the transaction is committed or
+    when enough files are staged. Files already holding their content are left
+    untouched. Used as a context manager, the transaction is committed on exit, or
+    its staged files are discarded if an exception is raised.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, sync=True):
+        self.batch_size = batch_size
+        self.sync = sync
+        # open temporary file, its path and the path it replaces
+        self.staged = []
+
+    def write(self, content, path):
+        """Stages the content, a string or an iterator of strings, to be written
+        in a file. Returns False if the file already holds it.
+        """
+        if isinstance(content, str):
+            content = (content,)
+        temp_path = path + TEMP_SUFFIX
+        digest = hashlib.sha1()
+        file_content = open(temp_path, "wb")
+        try:
+            for chunk in content:
+                data = chunk.encode("utf8")
+                digest.update(data)
+                file_content.write(data)
+        except BaseException:
+            file_content.close()
+            os.remove(temp_path)
+            raise
+        if digest.hexdigest() == file_digest(path):
+            file_content.close()
+            os.remove(temp_path)
+            timing.count("files unchanged")
+            return False
+        self.staged.append((file_content, temp_path, path))
+        if len(self.staged) >= self.batch_size:
+            self.commit()
+        return True
+
+    def commit(self):
+        """Syncs the staged files and moves them into place."""
+        for file_content, __, __ in self.staged:
+            file_content.flush()
+            if self.sync:
+                os.fsync(file_content.fileno())
+            file_content.close()
+        folders = set()
+        for __, temp_path, path in self.staged:
+            os.replace(temp_path, path)
+            timing.count_file("written", path)
+            folders.add(os.path.dirname(path))
+        if self.sync:
+            for folder in folders:
+                sync_directory(folder)
+        self.staged = []
+
+    def abort(self):
+        """Discards the staged files."""
+        for file_content, temp_path, __ in self.staged:
+            file_content.close()
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        self.staged = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
 
 
 def write_review(
-    content, folder, filename, root=os.getcwd(), extension="md", overwrite=False
+    content,
+    folder,
+    filename,
+    root=os.getcwd(),
+    extension="md",
+    overwrite=False,
+    transaction=None,
 ):
     """Writes the review file using the given data.
     Returns True to confirm review creation (or if review already exists).
     Set overwrite to True if review is not created but exported in a different format.
+    The file is written through the write transaction if given.
     """
     if not os.path.exists(os.path.join(root, folder)):
         os.makedirs(os.path.join(root, folder))
@@ -121,5 +290,8 @@ def write_review(
         click.echo(style_error("File exists, operation aborted"))
         return True
 
-    write_file(content, filepath)
+    if transaction is not None:
+        transaction.write(content, filepath)
+    else:
+        write_file(content, filepath)
     return True